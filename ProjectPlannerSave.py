@@ -1,10 +1,23 @@
 import sublime, sublime_plugin
+from .ProjectPlanner import SKIP_COMPILE
 
 class ProjectPlannerSave(sublime_plugin.EventListener):
-	def on_pre_save(self, view):
+	def _is_plan(self, view):
 		file_name = view.file_name()
-		if file_name.endswith('.projectplan.md'):
+		return file_name is not None and file_name.endswith('.projectplan.md')
+
+	def _in_background(self):
+		conf = sublime.load_settings('ProjectPlanner.sublime-settings')
+		return conf.get('compile_in_background', False)
+
+	def on_pre_save(self, view):
+		if self._is_plan(view) and not self._in_background():
 			view.run_command('project_planner_compile')
-			# import profile
-			# profile.runctx("view.run_command('roadmap_compile')", {}, {'view': view}, filename="/home/pedro/roadmapcompileplugin.profile")
 
+	def on_post_save(self, view):
+		if view.settings().get(SKIP_COMPILE):
+			# Saving the result of a background compile
+			view.settings().erase(SKIP_COMPILE)
+			return
+		if self._is_plan(view) and self._in_background():
+			view.run_command('project_planner_compile_async', {'save': True})
@@ -1,17 +1,57 @@
 import sublime, sublime_plugin
 from subprocess import call
 import os, sys, re
+import hashlib
 from operator import attrgetter
 from datetime import datetime, date
 from collections import namedtuple, Counter
 
-from .lib import trollop
-from .lib import sublime_requests as requests
-from .models import Task, Section, Statistics, DaySlot, human_duration
-from .utils import extract_task_metadata
+from .planner.profiling import profiled_command
+
+# The Trello client (and with it the HTTP stack) and the models are imported
+# when a command runs, so they don't slow down loading the plugin
+
+def _load_settings():
+	return sublime.load_settings('ProjectPlanner.sublime-settings')
+
+def plugin_unloaded():
+	# Stop the HTTP helper process a sync may have started, without
+	# importing the HTTP stack if no command loaded it
+	sublime_requests = sys.modules.get(__package__ + '.lib.sublime_requests')
+	if sublime_requests is not None:
+		sublime_requests.HelperSession.shutdown()
+
+# The ResponseCache shared by the Trello commands, see _response_cache
+_responses = None
+
+def _response_cache(conf):
+	"""
+	The response cache of the Trello connections, None if disabled. A new one
+	is made when the credentials or its size change, from the responses
+	saved on disk with trello_cache_persist.
+	"""
+	global _responses
+	max_size = int(conf.get('trello_cache_size', 16) * 1024 * 1024)
+	if not max_size:
+		return None
+
+	owner = hashlib.sha1('{}:{}'.format(conf.get('TRELLO_API_KEY'), conf.get('TRELLO_TOKEN')).encode('utf-8')).hexdigest()
+	if _responses is None or _responses.owner != owner or _responses.max_size != max_size:
+		from .lib.trollop import ResponseCache
+		from .planner.trello_cache import responses_cache_path, load_responses
+		entries = load_responses(responses_cache_path(sublime.cache_path()), owner) if conf.get('trello_cache_persist', False) else []
+		_responses = ResponseCache(max_size, owner=owner, entries=entries)
+	_responses.ttls = dict(_responses.DEFAULT_TTLS, **(conf.get('trello_cache_ttl') or {}))
+	return _responses
+
+def _save_response_cache(conf, cache):
+	if cache is not None and conf.get('trello_cache_persist', False):
+		from .planner.trello_cache import responses_cache_path, save_responses
+		save_responses(responses_cache_path(sublime.cache_path()), cache)
 
 class ProjectPlannerTrelloUp(sublime_plugin.TextCommand):
 
+	@profiled_command('trello_up', _load_settings)
 	def run(self, edit):
 		conf = sublime.load_settings('ProjectPlanner.sublime-settings')
 		self.key = conf.get('TRELLO_API_KEY')
@@ -20,16 +60,19 @@ class ProjectPlannerTrelloUp(sublime_plugin.TextCommand):
 		self.skip_lists = conf.get("SKIP_LISTS")
 		self.done_lists = conf.get("DONE_LISTS")
 		self.skip_checklists = conf.get("SKIP_CHECKLISTS")
+		self.workers = conf.get('trello_request_workers', 8)
 
 		self.debug = False
 
-		trello_connection = trollop.TrelloConnection(self.key, self.token)
+		from .lib import trollop
+		trello_connection = trollop.TrelloConnection(self.key, self.token, self.workers, _response_cache(conf))
 
 		try:
 			self.safe_work(trello_connection, edit)
 		except Exception as e:
 			self.show_token_expired_help(e)
 			raise e
+		_save_response_cache(conf, trello_connection.cache)
 
 	def show_token_expired_help(self, e):
 		print("It seems your token is invalid or has expired, try adding it again.\nToken URL: %s" % self.token_url(), "The error encountered was: '%s'" % e)
@@ -37,17 +80,19 @@ class ProjectPlannerTrelloUp(sublime_plugin.TextCommand):
 	def token_url(self):
 		return "https://trello.com/1/connect?key=%s&name=project_planner&response_type=token&scope=read,write" % self.key
 
-	def __upload_card_order_in_section(self, connection, section):
+	def __card_positions_in_section(self, section):
 		trello_tasks = filter(lambda task: task.is_trello_card, section.all_tasks)
+		positions = []
 		last_pos = 100
 		for task in trello_tasks:
 			print('Set position {} for card {}'.format(last_pos, task.description))
-			connection.set_card_position(task.trello_id, last_pos)
+			positions.append((task.trello_id, last_pos))
 			last_pos += 100 # be nice with Trello by leaving gaps for reordering
+		return positions
 
 	def __upload_card_order(self, connection, sections):
-		for section in sections:
-			self.__upload_card_order_in_section(connection, section)
+		positions = [position for section in sections for position in self.__card_positions_in_section(section)]
+		connection.map(lambda position: connection.set_card_position(*position), positions)
 
 	def safe_work(self, connection, edit):
 		content=self.view.substr(sublime.Region(0, self.view.size()))
@@ -68,6 +113,7 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 		'## Trello warnings'
 	]
 
+	@profiled_command('trello', _load_settings)
 	def run(self, edit):
 		print('Trello plugin run')
 		conf = sublime.load_settings('ProjectPlanner.sublime-settings')
@@ -77,15 +123,19 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 		self.skip_lists = conf.get("SKIP_LISTS")
 		self.done_lists = conf.get("DONE_LISTS")
 		self.skip_checklists = conf.get("SKIP_CHECKLISTS")
+		self.workers = conf.get('trello_request_workers', 8)
+		self.delta_sync = conf.get('trello_delta_sync', False)
 		self.debug = False
 
-		trello_connection = trollop.TrelloConnection(self.key, self.token)
+		from .lib import trollop
+		trello_connection = trollop.TrelloConnection(self.key, self.token, self.workers, _response_cache(conf))
 
 		try:
 			self.safe_work(trello_connection, edit)
 		except Exception as e:
 			self.show_token_expired_help(e)
 			raise e
+		_save_response_cache(conf, trello_connection.cache)
 
 	def show_token_expired_help(self, e):
 		print("It seems your token is invalid or has expired, try adding it again.\nToken URL: %s" % self.token_url(), "The error encountered was: '%s'" % e)
@@ -204,6 +254,20 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 
 		return next_section
 
+	def load_board(self, connection):
+		"""
+		Loads the board in one request, or with delta sync by applying the
+		actions on the board since the last sync to the board cached then
+		"""
+		if not self.delta_sync:
+			connection.load_board(self.board_id)
+			return
+
+		from .planner.trello_cache import board_cache_path, load_board_snapshot, save_board_snapshot
+		path = board_cache_path(sublime.cache_path(), self.board_id)
+		connection.load_board(self.board_id, load_board_snapshot(path))
+		save_board_snapshot(path, connection.board_snapshot)
+
 	def update_last_update(self, edit):
 		heading_region = self.view.find('^## Trello warnings', 0)
 		if heading_region.begin() == -1:
@@ -233,6 +297,7 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 	def extract_sections(self, content):
 		# TODO: This is a copy-paste from RoadmapCompile. Extract into another
 		# module
+		from .planner.models import Section
 
 		array = content.split('\n')
 		section_indices = self.__section_indices(array)
@@ -256,6 +321,8 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 		return sections
 
 	def __compute_checkitem_duration(self, item):
+		from .planner.models import Section
+		from .planner.utils import extract_task_metadata
 		DEFAULT_CATEGORY_DURATION = 8
 
 		meta = extract_task_metadata(item._data['name'])[0]
@@ -298,23 +365,37 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 
 		return durations
 
-	def __update_card_metadata(self, connection, edit, task, section_title):
+	def __fetch_card(self, connection, task):
+		"""
+		The card linked from task with its checklists and their items, or None
+		for a task without card. Runs on a worker thread, it must not touch
+		the view.
+		"""
 		CARD_ID_REGEX = '.+https\:\/\/trello\.com\/c\/(?P<card_id>.+)\/.+'
 		match = re.search(CARD_ID_REGEX, task)
 
 		if not match:
-			return
+			return None
 
 		card = connection.get_card(match.group('card_id'))
+		checklists = [(checklist, checklist.checkItems) for checklist in card.checklists if checklist._data['name'] not in self.skip_checklists]
+		return card, checklists
+
+	def __update_card_metadata(self, edit, task, fetched, section_title):
+		from .planner.models import Section, human_duration
+		from .planner.utils import extract_task_metadata
+
+		if fetched is None:
+			return
+
+		card, checklists = fetched
 
 		if card.closed:
 			self.add_error('Archived cards', card._data['name'])
 
-		checklists = [checklist for checklist in card.checklists if checklist._data['name'] not in self.skip_checklists]
-
 		incomplete_items = []
-		for checklist in checklists:
-			its = [item for item in checklist.checkItems if item._data['state']=='incomplete']
+		for checklist, items in checklists:
+			its = [item for item in items if item._data['state']=='incomplete']
 			incomplete_items += its
 
 		# Filter out cards with the "M"-aybe flag
@@ -383,10 +464,10 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 		else:
 			self.view.insert(edit, line.end(), new_meta)
 
-	def __update_card_section_metadata(self, connection, edit, tasks, section_title):
+	def __update_card_section_metadata(self, edit, tasks, cards, section_title):
 		max_tasks = 1
 		for task in tasks:
-			self.__update_card_metadata(connection, edit, task, section_title)
+			self.__update_card_metadata(edit, task, cards[task], section_title)
 			max_tasks -= 1
 
 			if self.debug:
@@ -408,13 +489,17 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 			})
 
 	def update_cards_metadata(self, connection, edit, matches):
+		if self.debug:
+			matches = matches[:1]
 
-		for pair in matches:
-			tasks = [task.raw for task in pair.section.tasks]
-			self.__update_card_section_metadata(connection, edit, tasks, pair.section.title)
+		# Fetch the cards of every section concurrently, then update the tasks
+		# in document order so the edits don't depend on the request timings
+		section_tasks = [(pair.section.title, [task.raw for task in pair.section.tasks]) for pair in matches]
+		tasks = [task for section_title, tasks in section_tasks for task in tasks]
+		cards = dict(zip(tasks, connection.map(lambda task: self.__fetch_card(connection, task), tasks)))
 
-			if self.debug:
-				break
+		for section_title, tasks in section_tasks:
+			self.__update_card_section_metadata(edit, tasks, cards, section_title)
 
 	def display_errors(self, edit):
 		heading_region = self.view.find('^### Errors', 0)
@@ -457,7 +542,7 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 				if indices[index_idx - 1] > index:
 					self.add_error('List ordering', '*{}* should be placed before *{}*'.format(list_titles[index_idx-1], list_titles[index_idx]))
 
-	def mark_completed(self, sections, edit, done_lists):
+	def mark_completed(self, connection, sections, edit, done_lists):
 		"""
 		Mark as completed each card in the DONE list
 		"""
@@ -471,7 +556,7 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 			else:
 				return None
 
-		completed_cards = [card for list in done_lists for card in list.cards]
+		completed_cards = [card for cards in connection.map(lambda list: list.cards, done_lists) for card in cards]
 		section_titles = [section.title for section in sections if section.is_valid]
 		for section_title in section_titles:
 			for completed_card in completed_cards:
@@ -488,6 +573,9 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 		if self.debug:
 			print("DEBUG MODE IS ON")
 
+		# Lists, cards and checklists are read from this snapshot from now on
+		self.load_board(connection)
+
 		content=self.view.substr(sublime.Region(0, self.view.size()))
 		sections = self.extract_sections(content)
 		
@@ -511,6 +599,6 @@ class ProjectPlannerTrello(sublime_plugin.TextCommand):
 		matches = self.find_matching_sections(lists, sections)
 
 		self.update_cards_metadata(connection, edit, matches)
-		self.mark_completed(sections, edit, done_lists)
+		self.mark_completed(connection, sections, edit, done_lists)
 		self.display_errors(edit)
 		self.update_last_update(edit)
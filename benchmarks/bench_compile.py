@@ -0,0 +1,118 @@
+"""
+Times the stages of a compile on generated plans of growing size:
+
+    python benchmarks/bench_compile.py [--sizes 100,1000,10000,100000] [--repeat 3]
+        [--output results.json] [--compare baseline.json]
+
+Every stage is timed on a fresh compiler, so nothing is reused between
+repeats, and the best time of the repeats is kept. Results are written as
+JSON; --compare prints the ratio of every timing to an earlier run.
+"""
+import os, sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import importlib
+from collections import OrderedDict
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+engine = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.engine')
+
+from generate_plan import generate_plan
+
+STAGES = ['parse', 'statistics', 'schedule', 'render']
+SETTINGS = {
+	'default_daily_category_workload': 8 * 60,
+	'show_quarters_on_graphs': True,
+	'section_sampling': 'legacy',
+	'parallel_scheduling_workers': 0,
+}
+
+def time_stages(content, settings):
+	compiler = engine.PlanCompiler()
+	compiler._configure(settings)
+	timings = OrderedDict()
+
+	start = time.perf_counter()
+	sections = compiler._extract_sections(content)
+	timings['parse'] = time.perf_counter() - start
+
+	start = time.perf_counter()
+	statistics = compiler._analyse(sections)
+	timings['statistics'] = time.perf_counter() - start
+
+	start = time.perf_counter()
+	compiler._compute_schedule(sections, statistics)
+	timings['schedule'] = time.perf_counter() - start
+
+	start = time.perf_counter()
+	compiler._render(content, sections, statistics).apply()
+	timings['render'] = time.perf_counter() - start
+
+	timings['total'] = sum(timings.values())
+	return timings
+
+def run(sizes, repeat, settings):
+	results = OrderedDict()
+	for size in sizes:
+		content = generate_plan(tasks=size, sections=max(5, size // 100), seed=size)
+		runs = [time_stages(content, settings) for _ in range(repeat)]
+		results[str(size)] = OrderedDict([(stage, min([timings[stage] for timings in runs])) for stage in STAGES + ['total']])
+		print('{:>7} tasks  '.format(size) + '  '.join(['{} {:.3f}s'.format(stage, seconds) for stage, seconds in results[str(size)].items()]), file=sys.stderr)
+	return results
+
+def git_revision():
+	try:
+		return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PACKAGE_DIR, stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def compare(results, baseline):
+	print('{:>7}  {:>10}  {:>9}  {:>9}  {:>6}'.format('tasks', 'stage', 'baseline', 'now', 'ratio'))
+	for size, timings in results.items():
+		for stage, seconds in timings.items():
+			before = baseline['results'].get(size, {}).get(stage)
+			if before:
+				print('{:>7}  {:>10}  {:>8.3f}s  {:>8.3f}s  {:>5.2f}x'.format(size, stage, before, seconds, seconds / before))
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark the compile stages')
+	parser.add_argument('--sizes', default='100,1000,10000,100000', help='comma separated numbers of tasks')
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('--output', metavar='FILE', help='write the results as JSON to FILE')
+	parser.add_argument('--compare', metavar='FILE', help='compare with the results of an earlier run')
+	args = parser.parse_args(argv)
+
+	sizes = [int(size) for size in args.sizes.split(',')]
+	results = run(sizes, args.repeat, SETTINGS)
+
+	report = OrderedDict([
+		('benchmark', 'compile'),
+		('date', datetime.now().isoformat()),
+		('revision', git_revision()),
+		('python', platform.python_version()),
+		('platform', platform.platform()),
+		('repeat', args.repeat),
+		('settings', SETTINGS),
+		('results', results),
+	])
+
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as f:
+			json.dump(report, f, indent=2)
+	else:
+		json.dump(report, sys.stdout, indent=2)
+		print()
+
+	if args.compare:
+		with open(args.compare, encoding='utf-8') as f:
+			compare(results, json.load(f))
+
+if __name__ == '__main__':
+	main()
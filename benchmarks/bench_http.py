@@ -0,0 +1,132 @@
+"""
+Compares the HTTP transports of lib/sublime_requests.py on a local stub
+server that answers every request with a Trello-like card:
+
+    python benchmarks/bench_http.py [--requests 200] [--threads 1,8]
+        [--output results.json]
+
+`curl` starts a curl process for every request (the fallback when Sublime
+Text's Python has no SSL support), `helper` sends them through the
+long-lived helper process, `requests` is the built-in session for
+reference. The stub speaks plain HTTP, so the TLS handshakes curl repeats
+for every request against Trello aren't part of its timings.
+"""
+import os, sys
+import json
+import time
+import argparse
+import platform
+import importlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+sublime_requests = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.lib.sublime_requests')
+
+CARD = json.dumps({
+	'id': '5a1b2c3d4e5f60718293a4b5',
+	'shortLink': 'AbCdEfGh',
+	'name': 'A card [Dev 2h]',
+	'closed': False,
+	'url': 'https://trello.com/c/AbCdEfGh/1-a-card',
+	'idChecklists': ['5a1b2c3d4e5f60718293a4b6'],
+}).encode('utf-8')
+
+class CardHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+	# The headers and the body are written separately
+	disable_nagle_algorithm = True
+
+	def do_GET(self):
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(CARD)))
+		self.end_headers()
+		self.wfile.write(CARD)
+
+	def log_message(self, *args):
+		pass
+
+class StubServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+def transports():
+	available = OrderedDict([('requests', lambda: sublime_requests.session())])
+	if sublime_requests.HelperSession.python() is not None:
+		available['helper'] = lambda: sublime_requests.HelperSession()
+	try:
+		sublime_requests.commandline.find_binary('curl')
+		available['curl'] = lambda: sublime_requests.CurlSession()
+	except sublime_requests.commandline.BinaryNotFoundError:
+		pass
+	return available
+
+def requests_per_second(make_session, url, count, threads):
+	local = threading.local()
+
+	def get(index):
+		# One session per thread, as in TrelloConnection
+		if not hasattr(local, 'session'):
+			local.session = make_session()
+		response = local.session.request('GET', url)
+		assert response.status_code == 200 and response.content == CARD
+
+	get(0)  # starts the helper process, outside of the timings
+	start = time.perf_counter()
+	if threads == 1:
+		for index in range(count):
+			get(index)
+	else:
+		with ThreadPoolExecutor(max_workers=threads) as executor:
+			list(executor.map(get, range(count)))
+	return count / (time.perf_counter() - start)
+
+def run(count, thread_counts):
+	server = StubServer(('127.0.0.1', 0), CardHandler)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	url = 'http://127.0.0.1:{}/1/cards/AbCdEfGh'.format(server.server_address[1])
+
+	results = OrderedDict()
+	try:
+		for name, make_session in transports().items():
+			results[name] = OrderedDict()
+			for threads in thread_counts:
+				rate = requests_per_second(make_session, url, count, threads)
+				results[name][str(threads)] = rate
+				print('{:<9} {:>2} threads  {:>8.1f} requests/s'.format(name, threads, rate), file=sys.stderr)
+	finally:
+		server.shutdown()
+	return results
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark the HTTP transports')
+	parser.add_argument('--requests', type=int, default=200, help='number of requests per run')
+	parser.add_argument('--threads', default='1,8', help='comma separated numbers of threads sending the requests')
+	parser.add_argument('--output', metavar='FILE', help='write the results as JSON to FILE')
+	args = parser.parse_args(argv)
+
+	thread_counts = [int(threads) for threads in args.threads.split(',')]
+	report = OrderedDict([
+		('benchmark', 'http'),
+		('date', datetime.now().isoformat()),
+		('python', platform.python_version()),
+		('platform', platform.platform()),
+		('requests', args.requests),
+		('results', run(args.requests, thread_counts)),
+	])
+
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as f:
+			json.dump(report, f, indent=2)
+	else:
+		json.dump(report, sys.stdout, indent=2)
+		print()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,109 @@
+"""
+Times how long loading each plugin module, every .py file at the root of
+the package, takes the way Sublime Text imports it at start-up:
+
+    python benchmarks/bench_import.py [--repeat 10] [--output results.json]
+
+Every import runs in a fresh interpreter, so nothing is cached between
+repeats; the best and the median time are kept. The heavy modules that
+the import pulled in are listed too, as they should only be loaded once a
+command needs them. Outside Sublime Text, empty sublime, sublime_plugin and
+mdpopups modules stand in for the missing ones.
+"""
+import os, sys
+import json
+import shutil
+import argparse
+import tempfile
+import platform
+import subprocess
+from collections import OrderedDict
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCHMARKS_DIR)
+PACKAGE = os.path.basename(PACKAGE_DIR)
+
+# Sublime Text loads every module at the root of the package as a plugin
+PLUGINS = sorted([name[:-3] for name in os.listdir(PACKAGE_DIR) if name.endswith('.py')])
+HEAVY_MODULES = ['mdpopups', 'requests', 'cProfile', 'tracemalloc', 'concurrent.futures'] + ['{}.{}'.format(PACKAGE, name) for name in ['lib.trollop', 'lib.sublime_requests', 'planner.engine', 'planner.models', 'planner.scheduler', 'planner.batch']]
+
+PLACEHOLDERS = {
+	'sublime': '',
+	'sublime_plugin': ''.join(['class {}(object): pass\n'.format(name) for name in ['TextCommand', 'WindowCommand', 'ApplicationCommand', 'EventListener']]),
+	'mdpopups': '',
+}
+
+CHILD = """
+import sys, json, time, importlib
+sys.path.insert(0, {parent!r})
+# Only used if the real modules can't be found
+sys.path.append({placeholders!r})
+importlib.import_module({package!r})
+before = set(sys.modules)
+
+start = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - start
+
+json.dump({{'seconds': seconds, 'loaded': [name for name in {heavy!r} if name in sys.modules and name not in before]}}, sys.stdout)
+"""
+
+def write_placeholders(folder):
+	for name, content in PLACEHOLDERS.items():
+		with open(os.path.join(folder, name + '.py'), 'w', encoding='utf-8') as f:
+			f.write(content)
+
+def time_import(plugin, placeholders):
+	code = CHILD.format(parent=os.path.dirname(PACKAGE_DIR), placeholders=placeholders, package=PACKAGE, module=PACKAGE + '.' + plugin, heavy=HEAVY_MODULES)
+	return json.loads(subprocess.check_output([sys.executable, '-c', code]).decode())
+
+def median(values):
+	values = sorted(values)
+	middle = len(values) // 2
+	return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+def run(plugins, repeat, placeholders):
+	results = OrderedDict()
+	for plugin in plugins:
+		runs = [time_import(plugin, placeholders) for _ in range(repeat)]
+		seconds = [result['seconds'] for result in runs]
+		results[plugin] = OrderedDict([
+			('min', min(seconds)),
+			('median', median(seconds)),
+			('loaded', runs[0]['loaded']),
+		])
+		print('{:<22} min {:.1f}ms  median {:.1f}ms  loaded: {}'.format(plugin, min(seconds) * 1000, median(seconds) * 1000, ', '.join(runs[0]['loaded']) or '-'), file=sys.stderr)
+	return results
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark loading the plugin modules')
+	parser.add_argument('--repeat', type=int, default=10)
+	parser.add_argument('--output', metavar='FILE', help='write the results as JSON to FILE')
+	args = parser.parse_args(argv)
+
+	placeholders = tempfile.mkdtemp(prefix='projectplanner-bench-')
+	try:
+		write_placeholders(placeholders)
+		results = run(PLUGINS, args.repeat, placeholders)
+	finally:
+		shutil.rmtree(placeholders)
+
+	report = OrderedDict([
+		('benchmark', 'import'),
+		('date', datetime.now().isoformat()),
+		('python', platform.python_version()),
+		('platform', platform.platform()),
+		('repeat', args.repeat),
+		('results', results),
+	])
+
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as f:
+			json.dump(report, f, indent=2)
+	else:
+		json.dump(report, sys.stdout, indent=2)
+		print()
+
+if __name__ == '__main__':
+	main()
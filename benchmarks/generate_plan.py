@@ -0,0 +1,97 @@
+"""
+Generates synthetic .projectplan.md files for benchmarking:
+
+    python benchmarks/generate_plan.py --tasks 10000 --sections 50 > big.projectplan.md
+"""
+import sys
+import random
+import argparse
+from datetime import date, timedelta
+
+CATEGORY_NAMES = ['Math', 'Bio', 'Jap', 'Art', 'Por', 'Dev', 'Ops', 'Design', 'Docs', 'QA']
+WEIGHTS = ['', '', ' (0.5x)', ' (2x)', ' (3x)']
+# Duration units, the short ones being the most common
+UNITS = 'hhhdddw'
+
+def category_names(num_categories):
+	names = CATEGORY_NAMES[:num_categories]
+	names += ['Cat{}'.format(index) for index in range(len(names), num_categories)]
+	return names
+
+def generate_plan(tasks=1000, sections=10, categories=5, deadline_density=0.1, weighted=True, trello_links=0.1, completed=0.05, seed=0, start=None):
+	"""
+	A plan of `tasks` tasks spread over `sections` sections. Every task has
+	one or two of `categories` categories, mostly with a duration.
+	Deadlines, Trello links and completed tasks appear with the given
+	densities. Deadlines of a section are increasing, as they should be,
+	and lie after `start` (today by default).
+	"""
+	myrandom = random.Random(seed)
+	start = start or date.today()
+	names = category_names(categories)
+
+	lines = [
+		'# Generated plan', '',
+		'## Plan: Information', '',
+		'## Plan: Configuration', '',
+		'- Daily Workload: {} 6h'.format(names[0]), '',
+		'## Plan: Upcoming tasks', '',
+		'## Plan: Total estimated effort', '',
+		'## Plan: 12 Weekly effort timeline', '',
+		'## Plan: 40w Section schedule', '',
+	]
+
+	card = 0
+	for section in range(sections):
+		weight = myrandom.choice(WEIGHTS) if weighted else ''
+		lines += ['## Section {}{}'.format(section, weight), '']
+
+		deadline = start
+		section_tasks = tasks // sections + (1 if section < tasks % sections else 0)
+		for task in range(section_tasks):
+			meta = []
+			for category in myrandom.sample(names, myrandom.choice([1, 1, 1, 2])):
+				if myrandom.random() < 0.9:
+					meta.append('{} {}{}'.format(category, myrandom.randint(1, 8), myrandom.choice(UNITS)))
+				else:
+					meta.append(category)
+			if myrandom.random() < deadline_density:
+				deadline += timedelta(days=myrandom.randint(7, 60))
+				meta.append(deadline.isoformat())
+
+			description = 'Task {}-{}'.format(section, task)
+			if myrandom.random() < trello_links:
+				card += 1
+				description = '[{}](https://trello.com/c/card{}/{}-task-{}-{})'.format(description, card, card, section, task)
+
+			marker = '+' if myrandom.random() < completed else '-'
+			lines.append('{} {} [{}]'.format(marker, description, ' '.join(meta)))
+		lines.append('')
+
+	return '\n'.join(lines)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Generate a synthetic plan')
+	parser.add_argument('--tasks', type=int, default=1000)
+	parser.add_argument('--sections', type=int, default=10)
+	parser.add_argument('--categories', type=int, default=5)
+	parser.add_argument('--deadline-density', type=float, default=0.1, help='fraction of tasks with a deadline')
+	parser.add_argument('--no-weights', action='store_true', help='give every section the default weight')
+	parser.add_argument('--trello-links', type=float, default=0.1, help='fraction of tasks linked to a Trello card')
+	parser.add_argument('--completed', type=float, default=0.05, help='fraction of completed tasks')
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args(argv)
+
+	sys.stdout.write(generate_plan(
+		tasks = args.tasks,
+		sections = args.sections,
+		categories = args.categories,
+		deadline_density = args.deadline_density,
+		weighted = not args.no_weights,
+		trello_links = args.trello_links,
+		completed = args.completed,
+		seed = args.seed
+	))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,121 @@
+"""
+Helper process of sublime_requests.HelperSession, run by a system Python
+when Sublime Text's own has no SSL support. Reads one JSON request per line
+from stdin and writes one JSON response per line to stdout, tagged with the
+id of the request. Requests run on a few threads, each of which keeps its
+connections alive between requests.
+"""
+import sys
+import ssl
+import json
+import base64
+import threading
+from urllib.parse import urlsplit, urljoin
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import http.client as httplib
+except ImportError:
+    import httplib
+
+WORKERS = 8
+TIMEOUT = 60
+MAX_REDIRECTS = 5
+REDIRECTS = (301, 302, 303, 307, 308)
+# A kept alive connection the server closed fails like this before a
+# response is read, the request can be sent again on a new one
+STALE_CONNECTION = (httplib.BadStatusLine, ConnectionResetError, BrokenPipeError)
+
+local = threading.local()
+output_lock = threading.Lock()
+
+
+def connection(scheme, netloc, verify, proxy):
+    connections = local.__dict__.setdefault('connections', {})
+    key = (scheme, netloc, verify, proxy)
+    if key not in connections:
+        host = urlsplit(proxy).netloc if proxy else netloc
+        if scheme == 'https':
+            context = ssl.create_default_context(cafile=verify or None)
+            conn = httplib.HTTPSConnection(host, timeout=TIMEOUT, context=context)
+        else:
+            conn = httplib.HTTPConnection(host, timeout=TIMEOUT)
+        if proxy:
+            conn.set_tunnel(netloc)
+        connections[key] = conn
+    return connections[key]
+
+
+def close(scheme, netloc, verify, proxy):
+    conn = local.connections.pop((scheme, netloc, verify, proxy), None)
+    if conn is not None:
+        conn.close()
+
+
+def send(method, url, headers, body, verify, proxy):
+    parts = urlsplit(url)
+    path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+    key = (parts.scheme, parts.netloc, verify, proxy)
+    for attempt in range(2):
+        conn = connection(*key)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            content = response.read()
+        except STALE_CONNECTION:
+            close(*key)
+            if attempt:
+                raise
+            continue
+        except Exception:
+            close(*key)
+            raise
+        if response.will_close:
+            close(*key)
+        return response, content
+
+
+def fetch(request):
+    method = request['method'].upper()
+    url = request['url']
+    headers = request.get('headers') or {}
+    body = request.get('data')
+    body = body.encode('utf-8') if body is not None else None
+
+    for redirect in range(MAX_REDIRECTS + 1):
+        response, content = send(method, url, headers, body, request.get('verify'), request.get('proxy'))
+        location = response.getheader('Location')
+        if response.status not in REDIRECTS or not location or not request.get('allow_redirects', True):
+            break
+        url = urljoin(url, location)
+        if response.status == 303 or (response.status in (301, 302) and method == 'POST'):
+            method, body = 'GET', None
+
+    return {
+        'url': url,
+        'status': response.status,
+        'headers': response.getheaders(),
+        'body': base64.b64encode(content).decode('ascii'),
+    }
+
+
+def handle(request):
+    try:
+        response = fetch(request)
+    except Exception as e:
+        response = {'error': '{}: {}'.format(type(e).__name__, e)}
+    response['id'] = request['id']
+    line = json.dumps(response) + '\n'
+    with output_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def main():
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        for line in sys.stdin:
+            if line.strip():
+                executor.submit(handle, json.loads(line))
+
+
+if __name__ == '__main__':
+    main()
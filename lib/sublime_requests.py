@@ -1,15 +1,22 @@
 # From SublimeGithub: https://github.com/bgreenlee/sublime-github
 # Copyright (c) 2011 Brad Greenlee
 
+import os
 import re
+import json
+import base64
+import pkgutil
+import itertools
+import threading
+import subprocess
 import requests
 from requests.status_codes import codes
+from requests.structures import CaseInsensitiveDict
 try:
     import http.client as httplib
 except ImportError:
     import httplib
 from . import commandline
-import sublime
 from io import BytesIO
 import logging
 
@@ -91,6 +98,7 @@ class CurlSession(object):
         try:
             curl = commandline.find_binary('curl')
         except commandline.BinaryNotFoundError:
+            import sublime
             sublime.error_message("I couldn't find \"curl\" on your system. Curl is required on Linux. Please install it and try again.")
             return
 
@@ -132,14 +140,183 @@ class CurlSession(object):
         return self.request("post", *args, **kwargs)
 
     def _handle_curl_error(self, error):
+        import sublime
         sublime.error_message(
             self.CURL_ERRORS.get(error, "%s: %s" % (self.ERR_UNKNOWN_CODE, error)))
 
 
+class HelperProcess(object):
+    """
+    A long-lived http_helper.py process run by a system Python. Requests from
+    any thread are written to its stdin tagged with an id, and a reader
+    thread hands every response back to the thread waiting for it.
+    """
+
+    # Seconds a request may take, redirects and a queue behind the requests
+    # of other threads included; the helper times out every read after 60
+    TIMEOUT = 300
+
+    def __init__(self, python):
+        # Passed with -c, as the package may be zipped
+        source = pkgutil.get_data(__name__.rpartition('.')[0], 'http_helper.py')
+        if source is None:
+            # A namespace package has no loader to read it with
+            with open(os.path.join(os.path.dirname(__file__), 'http_helper.py'), 'rb') as f:
+                source = f.read()
+        source = source.decode('utf-8')
+        self.process = subprocess.Popen([python, '-c', source], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        # Waiting requests by id: an event and a list the response goes in
+        self._pending = {}
+        self.alive = True
+
+        reader = threading.Thread(target=self._read)
+        reader.daemon = True
+        reader.start()
+
+    def _read(self):
+        error = 'the HTTP helper process exited'
+        try:
+            for line in self.process.stdout:
+                response = json.loads(line.decode('utf-8'))
+                with self._lock:
+                    # Not waited for anymore when the request timed out
+                    waiting = self._pending.pop(response['id'], None)
+                    if waiting is not None:
+                        event, result = waiting
+                        result.append(response)
+                        event.set()
+        except Exception as e:
+            # Nothing it sends can be trusted anymore
+            error = 'the HTTP helper process failed: {}: {}'.format(type(e).__name__, e)
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+
+        with self._lock:
+            self.alive = False
+            for event, result in self._pending.values():
+                result.append({'error': error})
+                event.set()
+            self._pending.clear()
+
+    def request(self, request):
+        event, result = threading.Event(), []
+        with self._lock:
+            if not self.alive:
+                raise requests.exceptions.ConnectionError('the HTTP helper process exited')
+            request_id = next(self._ids)
+            self._pending[request_id] = (event, result)
+            line = json.dumps(dict(request, id=request_id)) + '\n'
+            try:
+                self.process.stdin.write(line.encode('utf-8'))
+                self.process.stdin.flush()
+            except OSError as e:
+                del self._pending[request_id]
+                self.alive = False
+                raise requests.exceptions.ConnectionError('the HTTP helper process exited: {}'.format(e))
+
+        if not event.wait(self.TIMEOUT):
+            with self._lock:
+                self._pending.pop(request_id, None)
+            # The reader may have answered it in the meantime
+            if not result:
+                raise requests.exceptions.ConnectionError('the HTTP helper process did not answer within {} seconds'.format(self.TIMEOUT))
+        return result[0]
+
+    def close(self, timeout=5):
+        """
+        Lets the process exit once the requests it is running are answered,
+        kills it if they take longer than timeout seconds
+        """
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class HelperSession(object):
+    """
+    Sends requests through a shared HelperProcess, which keeps the
+    connections alive across requests. Replaces curl, which starts a process
+    and connects again for every request, when a system Python is found.
+    """
+    _helper = None
+    _helper_lock = threading.Lock()
+
+    def __init__(self, verify=None):
+        self.verify = verify
+
+    @classmethod
+    def python(cls):
+        try:
+            return commandline.find_binary('python3')
+        except commandline.BinaryNotFoundError:
+            return None
+
+    @classmethod
+    def helper(cls):
+        with cls._helper_lock:
+            if cls._helper is None or not cls._helper.alive:
+                cls._helper = HelperProcess(cls.python())
+            return cls._helper
+
+    @classmethod
+    def shutdown(cls):
+        """
+        Stops the shared helper process, if one was started
+        """
+        with cls._helper_lock:
+            helper, cls._helper = cls._helper, None
+        if helper is not None:
+            helper.close()
+
+    def request(self, method, url, headers=None, params=None, data=None, auth=None, allow_redirects=True, config=None, proxies=None):
+        headers = dict(headers or {})
+        headers.setdefault('User-Agent', 'Sublime Trello')
+        if auth:
+            credentials = base64.b64encode('{}:{}'.format(*auth).encode('utf-8')).decode('ascii')
+            headers['Authorization'] = 'Basic ' + credentials
+        if params:
+            url += '?' + '&'.join(['='.join([k, str(v)]) for k, v in params.items()])
+
+        raw_response = self.helper().request({
+            'method': method,
+            'url': url,
+            'headers': headers,
+            'data': data,
+            'verify': self.verify,
+            'proxy': (proxies or {}).get('https'),
+            'allow_redirects': allow_redirects,
+        })
+        if 'error' in raw_response:
+            raise requests.exceptions.ConnectionError(raw_response['error'])
+
+        response = requests.models.Response()
+        response.encoding = 'utf-8'
+        response.status_code = raw_response['status']
+        response.headers = CaseInsensitiveDict(raw_response['headers'])
+        response._content = base64.b64decode(raw_response['body'])
+        response.url = raw_response['url']
+        return response
+
+    def post(self, *args, **kwargs):
+        return self.request("post", *args, **kwargs)
+
+
 def session(verify=None, force_curl=False):
     if not force_curl and hasattr(httplib, "HTTPSConnection"):
         session = requests.Session()
         session.verify = verify
         return session
+    elif not force_curl and HelperSession.python() is not None:
+        return HelperSession(verify=verify)
     else:  # try curl
         return CurlSession(verify=verify)
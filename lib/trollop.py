@@ -1,6 +1,12 @@
 from urllib.parse import urlencode
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 import json
 
+from requests.exceptions import HTTPError
+
 # import requests
 from . import sublime_requests as requests
 
@@ -13,35 +19,185 @@ def get_class(str_or_class):
         return str_or_class
 
 
+def is_under(key, path):
+    """
+    Whether key is path, a path under it or path with parameters
+    """
+    return key.startswith(path) and key[len(path):][:1] in ('', '/', '?')
+
+
+CacheEntry = namedtuple('CacheEntry', ['stored_at', 'etag', 'text'])
+
+
+class ResponseCache(object):
+    """
+    GET responses by path and parameters, without the credentials. A
+    response is served as is for the TTL of its resource (eg 'cards' for
+    /lists/<id>/cards); after that it is revalidated with its ETag. The
+    least recently used responses are dropped to keep the cached text under
+    max_size bytes, encoded as UTF-8.
+    """
+
+    # Seconds, actions are always asked for as the delta sync relies on them
+    DEFAULT_TTLS = {
+        'actions': 0,
+        'boards': 30,
+        'lists': 30,
+        'cards': 30,
+        'checklists': 30,
+        'checkItems': 30,
+        'members': 3600,
+        'organizations': 3600,
+    }
+
+    def __init__(self, max_size, ttls=None, owner=None, entries=()):
+        self.max_size = max_size
+        self.ttls = dict(self.DEFAULT_TTLS, **(ttls or {}))
+        # Whose credentials the responses were fetched with
+        self.owner = owner
+        self._entries = OrderedDict()
+        # UTF-8 sizes of the texts by key, and their sum
+        self._sizes = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        for key, entry in entries:
+            self.store(key, entry.text, entry.etag, entry.stored_at)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+    def ttl(self, path):
+        # What the path points to or lists: /boards/<id>/cards -> cards
+        resource = path.strip('/').split('/')[::2][-1]
+        return self.ttls.get(resource, 0)
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key, text, etag=None, stored_at=None):
+        size = len(text.encode('utf-8'))
+        if size > self.max_size:
+            return
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._size -= self._sizes.pop(key)
+            self._entries[key] = CacheEntry(time.time() if stored_at is None else stored_at, etag, text)
+            self._sizes[key] = size
+            self._size += size
+            while self._size > self.max_size:
+                key, entry = self._entries.popitem(last=False)
+                self._size -= self._sizes.pop(key)
+
+    def invalidate(self, path=''):
+        """
+        Drop the responses of path and of the paths under it, all of them by
+        default
+        """
+        with self._lock:
+            for key in [key for key in self._entries if is_under(key, path)]:
+                del self._entries[key]
+                self._size -= self._sizes.pop(key)
+
+    def entries(self):
+        """
+        (key, entry) pairs from the least to the most recently used
+        """
+        with self._lock:
+            return list(self._entries.items())
+
+
 class TrelloConnection(object):
 
-    def __init__(self, api_key, oauth_token):
-        self.session = requests.session()
+    DEFAULT_WORKERS = 8
+
+    def __init__(self, api_key, oauth_token, workers=DEFAULT_WORKERS, cache=None):
+        self._local = threading.local()
 
         self.key = api_key
         self.token = oauth_token
+        # Number of requests map() runs at the same time
+        self.workers = workers
+        # A ResponseCache for GET requests, possibly shared by connections
+        self.cache = cache
+
+        # Object and sublist data fetched up front, by API path
+        self.preloaded = {}
+        # The board loaded by load_board
+        self.board_snapshot = None
+
+    @property
+    def session(self):
+        # Sessions are not thread safe, every thread gets its own
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.session()
+        return session
+
+    def map(self, function, items):
+        """
+        Call function on every item on a pool of `workers` threads, so that
+        the requests it makes overlap. The results are in the order of items.
+        """
+        items = list(items)
+        if self.workers <= 1 or len(items) <= 1:
+            return [function(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items))) as executor:
+            return list(executor.map(function, items))
 
-    def request(self, method, path, params=None, body=None):
+    def request(self, method, path, params=None, body=None, revalidate=False):
+        """
+        Send the request, or answer a GET from the cache. With revalidate, a
+        cached response is checked with the server even while fresh.
+        """
         if not path.startswith('/'):
             path = '/' + path
-        url = 'https://api.trello.com/1' + path
-
         params = params or {}
-        params.update({'key': self.key, 'token': self.token})
+
+        if self.cache is None:
+            return self._send(method, path, params, body).text
+
+        if method != 'GET':
+            response = self._send(method, path, params, body)
+            # The changed object may be part of any listing
+            self.cache.invalidate()
+            return response.text
+
+        key = path + '?' + urlencode(sorted(params.items()))
+        entry = self.cache.lookup(key)
+        if entry is not None and not revalidate and time.time() - entry.stored_at < self.cache.ttl(path):
+            return entry.text
+
+        headers = {'If-None-Match': entry.etag} if entry is not None and entry.etag else None
+        response = self._send(method, path, params, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self.cache.store(key, entry.text, entry.etag)
+            return entry.text
+        self.cache.store(key, response.text, response.headers.get('ETag'))
+        return response.text
+
+    def _send(self, method, path, params, body=None, headers=None):
+        url = 'https://api.trello.com/1' + path
+        params = dict(params, key=self.key, token=self.token)
         url += '?' + urlencode(params)
 
         # Trello recently got picky about headers.  Only set content type if
         # we're submitting a payload in the body
         if body:
-            headers = {'Content-Type': 'application/json'}
-        else:
-            headers = None
+            headers = dict(headers or {}, **{'Content-Type': 'application/json'})
         response = self.session.request(method, url, data=body, headers=headers)
         response.raise_for_status()
-        return response.text
+        return response
 
-    def get(self, path, params=None):
-        return self.request('GET', path, params)
+    def get(self, path, params=None, revalidate=False):
+        return self.request('GET', path, params, revalidate=revalidate)
 
     def post(self, path, params=None, body=None):
         return self.request('POST', path, params, body)
@@ -55,6 +211,113 @@ class TrelloConnection(object):
     def get_board(self, board_id):
         return Board(self, board_id)
 
+    def load_board(self, board_id, snapshot=None):
+        """
+        Load the board with its open lists and all of its cards and
+        checklists, from a single request or, given the snapshot of an earlier
+        sync, by bringing it up to date with the actions on the board since.
+        The board, its lists, cards (by id and short link), checklists and
+        check items are then built from this snapshot instead of being
+        fetched one by one. The snapshot is kept in board_snapshot.
+        """
+        if snapshot is not None and snapshot.board_id == board_id:
+            try:
+                updated = self.update_board_snapshot(snapshot)
+            except HTTPError:
+                updated = None
+            # The board changed too much to catch up, don't take it from the
+            # cache either
+            snapshot = updated or self.fetch_board_snapshot(board_id, revalidate=True)
+        else:
+            snapshot = self.fetch_board_snapshot(board_id)
+
+        self.board_snapshot = snapshot
+        self._preload(snapshot)
+        return Board(self, snapshot.board['id'], snapshot.board)
+
+    def fetch_board_snapshot(self, board_id, revalidate=False):
+        params = {'lists': 'open', 'cards': 'all', 'checklists': 'all', 'actions': 'all', 'actions_limit': 1}
+        data = json.loads(self.get(Board._prefix + board_id, params, revalidate))
+        actions = data.pop('actions', [])
+        return BoardSnapshot(board_id, data, BoardSnapshot.cursor_of(actions))
+
+    def update_board_snapshot(self, snapshot):
+        """
+        Apply the actions on the board since the cursor of snapshot to it. The
+        cards and lists changed by actions that don't carry enough data are
+        fetched again. None if there were too many actions to replay.
+        """
+        params = {'limit': BoardSnapshot.MAX_ACTIONS}
+        if snapshot.cursor:
+            params['since'] = snapshot.cursor['date']
+        path = Board._prefix + snapshot.board_id + Action._prefix
+        actions = json.loads(self.get(path, params))
+        if len(actions) >= BoardSnapshot.MAX_ACTIONS:
+            return None
+        # since includes the action of the cursor itself
+        actions = [action for action in actions if not snapshot.cursor or action['id'] != snapshot.cursor['id']]
+        if not actions:
+            return snapshot
+
+        stale_cards, stale_lists = [], False
+        # Actions come newest first
+        for action in reversed(actions):
+            applied = snapshot.apply(action)
+            card = action.get('data', {}).get('card')
+            if applied:
+                continue
+            elif card is not None:
+                if card['id'] not in stale_cards:
+                    stale_cards.append(card['id'])
+            else:
+                stale_lists = True
+
+        for card_id, card in zip(stale_cards, self.map(self._fetch_card_with_checklists, stale_cards)):
+            snapshot.replace_card(card_id, card)
+        if stale_lists:
+            path = Board._prefix + snapshot.board_id + List._prefix
+            snapshot.lists[:] = json.loads(self.get(path, {'filter': 'open'}, revalidate=True))
+
+        snapshot.cursor = BoardSnapshot.cursor_of(actions)
+        return snapshot
+
+    def _fetch_card_with_checklists(self, card_id):
+        try:
+            # Changed since it was cached, if it was
+            return json.loads(self.get(Card._prefix + card_id, {'checklists': 'all'}, revalidate=True))
+        except HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                # Deleted
+                return None
+            raise
+
+    def _preload(self, snapshot):
+        board, lists, cards, checklists = snapshot.board, snapshot.lists, snapshot.cards, snapshot.checklists
+        # Like /boards/<id>/cards and /lists/<id>/cards, leave out archived
+        # cards from the sublists
+        open_cards = sorted([card for card in cards if not card.get('closed')], key=lambda card: card.get('pos', 0))
+
+        for key in set([snapshot.board_id, board['id']]):
+            path = Board._prefix + key
+            self.preloaded[path] = board
+            self.preloaded[path + List._prefix] = lists
+            self.preloaded[path + Card._prefix] = open_cards
+            self.preloaded[path + Checklist._prefix] = checklists
+
+        for list_data in lists:
+            path = List._prefix + list_data['id']
+            self.preloaded[path] = list_data
+            self.preloaded[path + Card._prefix] = [card for card in open_cards if card['idList'] == list_data['id']]
+
+        for card in cards:
+            for key in set([card['id'], card.get('shortLink', card['id'])]):
+                self.preloaded[Card._prefix + key] = card
+
+        for checklist in checklists:
+            path = Checklist._prefix + checklist['id']
+            self.preloaded[path] = checklist
+            self.preloaded[path + CheckItem._prefix] = checklist.get('checkItems', [])
+
     def get_card(self, card_id):
         return Card(self, card_id)
 
@@ -87,6 +350,99 @@ class TrelloConnection(object):
         return Member(self, 'me')
 
 
+class BoardSnapshot(object):
+    """
+    The data of a board with its open lists and all of its cards and
+    checklists, and the latest action on the board it includes (the cursor).
+    Applying the later actions brings it up to date.
+    """
+
+    # More actions since the cursor than this are not replayed
+    MAX_ACTIONS = 1000
+
+    # The fields of updateCard actions which are applied
+    CARD_FIELDS = ('idList', 'name', 'closed', 'pos', 'desc', 'due')
+
+    # Actions which change nothing in the snapshot
+    IGNORED_ACTIONS = (
+        'commentCard', 'updateComment', 'deleteComment',
+        'addMemberToCard', 'removeMemberFromCard',
+        'addAttachmentToCard', 'deleteAttachmentFromCard',
+        'addLabelToCard', 'removeLabelFromCard',
+        'addMemberToBoard', 'makeNormalMemberOfBoard', 'makeAdminOfBoard',
+        'updateBoard', 'enablePowerUp', 'disablePowerUp',
+    )
+
+    def __init__(self, board_id, data, cursor=None):
+        self.board_id = board_id
+        self.lists = data.pop('lists', [])
+        self.cards = data.pop('cards', [])
+        self.checklists = data.pop('checklists', [])
+        self.board = data
+        self.cursor = cursor
+
+    @staticmethod
+    def cursor_of(actions):
+        # Actions come newest first
+        return {'id': actions[0]['id'], 'date': actions[0]['date']} if actions else None
+
+    def to_dict(self):
+        data = dict(self.board, lists=self.lists, cards=self.cards, checklists=self.checklists)
+        return {'board_id': self.board_id, 'cursor': self.cursor, 'data': data}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(values['board_id'], dict(values['data']), values['cursor'])
+
+    def _find(self, items, item_id):
+        for item in items:
+            if item['id'] == item_id:
+                return item
+        return None
+
+    def apply(self, action):
+        """
+        Apply action to the snapshot. False if the action doesn't carry enough
+        data to do so, the card or the lists it changed must be fetched again.
+        """
+        data = action.get('data', {})
+        card_data = data.get('card', {})
+        card = self._find(self.cards, card_data.get('id'))
+
+        if action['type'] in self.IGNORED_ACTIONS:
+            return True
+        elif action['type'] == 'updateCard' and card is not None:
+            changed = list(data.get('old', {}).keys())
+            if not all([field in self.CARD_FIELDS and field in card_data for field in changed]):
+                return False
+            for field in changed:
+                card[field] = card_data[field]
+            return True
+        elif action['type'] == 'updateCheckItemStateOnCard':
+            checklist = self._find(self.checklists, data.get('checklist', {}).get('id'))
+            item = self._find(checklist.get('checkItems', []), data.get('checkItem', {}).get('id')) if checklist else None
+            if item is None:
+                return False
+            item['state'] = data['checkItem']['state']
+            return True
+        elif action['type'] in ('deleteCard', 'moveCardFromBoard'):
+            self.replace_card(card_data.get('id'), None)
+            return True
+        return False
+
+    def replace_card(self, card_id, card):
+        """
+        Replace the card and its checklists by card, as fetched with its
+        checklists, or remove them if card is None or not on the board
+        """
+        self.cards[:] = [other for other in self.cards if other['id'] != card_id]
+        self.checklists[:] = [checklist for checklist in self.checklists if checklist.get('idCard') != card_id]
+        if card is not None and card.get('idBoard', self.board.get('id')) == self.board.get('id'):
+            card = dict(card)
+            self.checklists.extend(card.pop('checklists', []))
+            self.cards.append(card)
+
+
 class Closable(object):
     """
     Mixin for Trello objects for which you're allowed to PUT to <id>/closed.
@@ -202,16 +558,14 @@ class SubList(object):
         # cls may be a name of a class, or the class itself
         self.cls = cls
 
-        # A dict of sublists, by instance id
-        self._lists = {}
-
     def __get__(self, instance, owner):
-        if not instance._id in self._lists:
-            cls = get_class(self.cls)
-            path = instance._prefix + instance._id + cls._prefix
+        cls = get_class(self.cls)
+        path = instance._prefix + instance._id + cls._prefix
+        data = instance._conn.preloaded.get(path)
+        if data is None:
+            # Cached by the connection, if it has a cache
             data = json.loads(instance._conn.get(path))
-            self._lists[instance._id] = [cls(instance._conn, d['id'], d) for d in data]
-        return self._lists[instance._id]
+        return [cls(instance._conn, d['id'], d) for d in data]
 
 
 class TrelloMeta(type):
@@ -258,7 +612,11 @@ class LazyTrello(object):
             # fetched data from Trello yet, do so now.  Cache the result on the
             # object.
             if not '_data' in self.__dict__:
-                self._data = json.loads(self._conn.get(self._path))
+                preloaded = self._conn.preloaded.get(self._path)
+                if preloaded is not None:
+                    self._data = preloaded
+                else:
+                    self._data = json.loads(self._conn.get(self._path))
                 # print(self._data)
 
             return self._data
@@ -284,6 +642,9 @@ class LazyTrello(object):
 
     def reload(self):
         self.__dict__.pop("_data", None)
+        self._conn.preloaded = dict([(path, data) for path, data in self._conn.preloaded.items() if not is_under(path, self._path)])
+        if self._conn.cache is not None:
+            self._conn.cache.invalidate(self._path)
 
 ### BEGIN ACTUAL WRAPPER OBJECTS
 
@@ -326,9 +687,6 @@ class Board(LazyTrello, Closable):
         new_list = List(self._conn, data['id'], data)
         return new_list
 
-    def reload(self):
-        Board.lists = SubList('List')
-
 class Card(LazyTrello, Closable, Deletable, Labeled):
 
     _prefix = '/cards/'
@@ -413,10 +771,6 @@ class List(LazyTrello, Closable):
         card = Card(self._conn, data['id'], data)
         return card
 
-    def reload(self):
-        List.board = ObjectField('idBoard', 'Board')
-        List.cards = SubList('Card')
-
 class Member(LazyTrello):
 
     _prefix = '/members/'
@@ -447,9 +801,6 @@ class Member(LazyTrello):
     def unread_notifications(self):
         return Notification(self._conn, "").unread(self)
 
-    def reload(self):
-        Member.boards = SubList('Board')
-
 class Notification(LazyTrello):
 
     _prefix = '/notifications/'
@@ -0,0 +1,95 @@
+import os
+import time
+import pickle
+import multiprocessing
+from collections import namedtuple
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .engine import PlanCompiler, schedule_data
+from .sidecar import sidecar_path
+from .utils import write_atomically
+
+PLAN_EXTENSION = '.projectplan.md'
+
+PlanResult = namedtuple('PlanResult', ['path', 'seconds', 'changed', 'errors', 'failure', 'text', 'schedule'])
+
+def find_plans(folder):
+	"""
+	Every plan under folder, in a stable order
+	"""
+	plans = []
+	for root, dirs, files in os.walk(folder):
+		dirs.sort()
+		plans += [os.path.join(root, name) for name in sorted(files) if name.endswith(PLAN_EXTENSION)]
+	return plans
+
+def compile_plan(path, settings, write=True, processes=True):
+	"""
+	Compiles the plan at path, writing it back if it changed. A plan that
+	cannot be compiled is reported as a failure instead of stopping the batch.
+	processes is passed on to the PlanCompiler.
+	"""
+	start = time.perf_counter()
+	try:
+		with open(path, encoding='utf-8', newline='') as f:
+			content = f.read()
+		# Compiled with \n line endings, written back with those of the plan
+		newline = '\r\n' if '\r\n' in content else '\n'
+		content = content.replace('\r\n', '\n')
+		sidecar = sidecar_path(path) if settings.get('schedule_cache_sidecar') else None
+		compiled = PlanCompiler(processes).compile(content, settings, sidecar=sidecar)
+		changed = compiled.text != content
+		if write and changed:
+			write_atomically(path, compiled.text.replace('\n', newline))
+	except Exception as e:
+		return PlanResult(path, time.perf_counter() - start, False, [], '{}: {}'.format(type(e).__name__, e), None, None)
+
+	return PlanResult(path, time.perf_counter() - start, changed, compiled.errors, None, compiled.text, schedule_data(compiled))
+
+def compile_plans(paths, settings, workers=None, write=True, processes=True):
+	"""
+	Compiles the plans on a process pool of `workers` processes, one per
+	CPU if None, or serially if workers is 1. Without processes, a thread
+	pool is used instead, for hosts that can't start Python processes such
+	as the Sublime Text plugin host. Results are in the order of paths.
+	"""
+	parallel = workers != 1 and len(paths) > 1
+	if parallel:
+		# Plans are already compiled in parallel, don't nest pools
+		settings = dict(settings)
+		settings['parallel_scheduling_workers'] = 0
+
+	if parallel and not processes:
+		with ThreadPoolExecutor(max_workers=workers or multiprocessing.cpu_count()) as executor:
+			return list(executor.map(compile_plan, paths, repeat(settings), repeat(write), repeat(False)))
+
+	if parallel:
+		try:
+			with ProcessPoolExecutor(max_workers=workers) as executor:
+				return list(executor.map(compile_plan, paths, repeat(settings), repeat(write)))
+		except (OSError, ImportError, BrokenProcessPool, pickle.PicklingError) as e:
+			print('ProjectPlanner: parallel batch compile failed ({}), compiling serially'.format(e))
+
+	return [compile_plan(path, settings, write, processes) for path in paths]
+
+def report(results):
+	"""
+	One line per plan with its timing and errors, followed by the totals
+	"""
+	lines = []
+	for result in results:
+		if result.failure:
+			status = 'FAILED: ' + result.failure
+		else:
+			num_errors = sum([len(group['errors']) for group in result.errors])
+			status = '{} ({} errors)'.format('updated' if result.changed else 'unchanged', num_errors)
+		lines.append('{:>8.3f}s  {}  {}'.format(result.seconds, result.path, status))
+		for group in result.errors:
+			for error in group['errors']:
+				lines.append('            {}: {}'.format(group['category'], error))
+
+	failed = len([result for result in results if result.failure])
+	changed = len([result for result in results if result.changed])
+	lines.append('{} plans, {} updated, {} failed, {:.3f}s in total'.format(len(results), changed, failed, sum([result.seconds for result in results])))
+	return '\n'.join(lines)
@@ -0,0 +1,95 @@
+"""
+Compiles .projectplan.md files without Sublime Text:
+
+    python -m ProjectPlanner.planner.cli [--settings FILE] [--stdout] [--json FILE] [--workers N] PLAN...
+    python path/to/ProjectPlanner/planner/cli.py PLAN...
+
+A folder given as PLAN stands for every plan under it.
+"""
+import os, sys
+import re
+import argparse
+import json
+from collections import OrderedDict
+
+if not __package__:
+	# Run as a script (or re-imported as one by a spawned worker): import
+	# the plugin directory as a package, so the relative imports work
+	import importlib
+	package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	sys.path.insert(0, os.path.dirname(package_dir))
+	__package__ = os.path.basename(package_dir) + '.planner'
+	importlib.import_module(__package__)
+
+from .batch import find_plans, compile_plans, report
+
+DEFAULT_SETTINGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ProjectPlanner.sublime-settings')
+
+# Strings are matched first so that what looks like a comment or a
+# trailing comma inside of one is kept
+COMMENTS = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/', re.S)
+TRAILING_COMMAS = re.compile(r'("(?:\\.|[^"\\])*")|,(?=\s*[\]}])')
+
+def decode_settings(text):
+	"""
+	Parses settings the way sublime.decode_value does, allowing comments and
+	trailing commas. Comments become blank lines so errors point at the
+	right line.
+	"""
+	text = COMMENTS.sub(lambda m: m.group(1) or '\n' * m.group(0).count('\n'), text)
+	text = TRAILING_COMMAS.sub(lambda m: m.group(1) or '', text)
+	return json.loads(text)
+
+def load_settings(paths):
+	"""
+	Merges the settings files in order, later ones overriding earlier ones
+	"""
+	settings = {}
+	for path in paths:
+		with open(path, encoding='utf-8') as f:
+			try:
+				values = decode_settings(f.read())
+			except ValueError as e:
+				raise ValueError('{}: {}'.format(path, e))
+		if not isinstance(values, dict):
+			raise ValueError('{}: expected an object of settings'.format(path))
+		settings.update(values)
+	return settings
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='projectplanner', description='Compile .projectplan.md files')
+	parser.add_argument('plans', nargs='+', metavar='PLAN', help='plan files or folders to compile')
+	parser.add_argument('--settings', action='append', default=[], metavar='FILE', help='settings file overriding the defaults, may be repeated')
+	parser.add_argument('--stdout', action='store_true', help='print the compiled plans instead of writing them back')
+	parser.add_argument('--json', metavar='FILE', help='write the schedule of every plan as JSON to FILE, - for stdout')
+	parser.add_argument('--workers', type=int, metavar='N', help='number of worker processes, one per CPU by default')
+	args = parser.parse_args(argv)
+
+	try:
+		settings = load_settings([DEFAULT_SETTINGS] + args.settings)
+	except (OSError, ValueError) as e:
+		parser.error('invalid settings, {}'.format(e))
+
+	paths = []
+	for path in args.plans:
+		paths += find_plans(path) if os.path.isdir(path) else [path]
+
+	results = compile_plans(paths, settings, workers=args.workers, write=not args.stdout)
+	print(report(results), file=sys.stderr)
+
+	if args.stdout:
+		for result in results:
+			if result.text is not None:
+				sys.stdout.write(result.text)
+
+	schedules = OrderedDict([(result.path, result.schedule) for result in results if result.schedule is not None])
+	if args.json == '-':
+		json.dump(schedules, sys.stdout, indent=2)
+	elif args.json:
+		with open(args.json, 'w', encoding='utf-8') as f:
+			json.dump(schedules, f, indent=2)
+
+	return 1 if [result for result in results if result.failure] else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
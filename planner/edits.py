@@ -0,0 +1,130 @@
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+Edit = namedtuple('Edit', ['begin', 'end', 'content', 'order'])
+
+class EditPlan(object):
+	"""EditPlan(text)
+
+	Collects the replacements of a compile against one snapshot of the
+	text. Offsets always refer to the snapshot, so planning an edit never
+	moves the targets of the others.
+	"""
+	HEADING_IDENTIFIER = '#'
+
+	def __init__(self, text):
+		self.text = text
+		self._edits = []
+		self._patterns = {}
+
+		# The only full scan of the document: line starts and headings
+		self._line_starts = [0] + [match.end() for match in re.finditer('\n', text)]
+		self._headings = [row for row, begin in enumerate(self._line_starts) if text.startswith(self.HEADING_IDENTIFIER, begin)]
+		self._heading_starts = [self._line_starts[row] for row in self._headings]
+
+	def __len__(self):
+		return len(self._edits)
+
+	@property
+	def num_rows(self):
+		return len(self._line_starts)
+
+	def row(self, row):
+		"""
+		Region of the given row, without its newline
+		"""
+		row = max(0, min(row, self.num_rows - 1))
+		begin = self._line_starts[row]
+		end = self._line_starts[row + 1] - 1 if row + 1 < self.num_rows else len(self.text)
+		return (begin, end)
+
+	def row_at(self, offset):
+		return bisect_right(self._line_starts, offset) - 1
+
+	def line(self, offset):
+		"""
+		Region of the row containing offset
+		"""
+		return self.row(self.row_at(offset))
+
+	def substr(self, region):
+		return self.text[region[0]:region[1]]
+
+	def find(self, string, start=0):
+		"""
+		Literal search, returns the region of the first match or None
+		"""
+		begin = self.text.find(string, start)
+		return (begin, begin + len(string)) if begin != -1 else None
+
+	def _pattern(self, pattern):
+		if pattern not in self._patterns:
+			self._patterns[pattern] = re.compile(pattern, re.MULTILINE)
+		return self._patterns[pattern]
+
+	def find_heading(self, pattern):
+		"""
+		Searches pattern in the heading rows only. Returns the region of the
+		first match or None.
+		"""
+		regex = self._pattern(pattern)
+		for row in self._headings:
+			begin, end = self.row(row)
+			match = regex.search(self.text, begin, end)
+			if match:
+				return (match.start(), match.end())
+		return None
+
+	def next_heading(self, offset, prefix='##'):
+		"""
+		Start of the first heading after offset beginning with prefix, or
+		the end of the text
+		"""
+		for index in range(bisect_left(self._heading_starts, offset), len(self._heading_starts)):
+			begin = self._heading_starts[index]
+			if begin >= offset and self.text.startswith(prefix, begin):
+				return begin
+		return len(self.text)
+
+	def replace(self, begin, end, content):
+		self._edits.append(Edit(begin, end, content, len(self._edits)))
+
+	def insert(self, offset, content):
+		self.replace(offset, offset, content)
+
+	def edits(self):
+		"""
+		Planned edits in the order they must be applied: from the end of
+		the text to its beginning. Inserts at the same offset keep the order
+		they were planned in, and come before the content of a region
+		replaced from there. When two edits overlap, the one planned last
+		wins, as it would have if they had been applied one after another.
+		"""
+		kept = []
+		# Regions of the kept edits, disjoint and sorted, so their ends are too
+		regions = []
+		for edit in sorted(self._edits, key=lambda edit: edit.order, reverse=True):
+			index = bisect_left(regions, (edit.end, -1))
+			if index > 0 and regions[index - 1][1] > edit.begin:
+				continue
+			insort(regions, (edit.begin, edit.end))
+			kept.append(edit)
+		# At the same offset the replace is applied first, so that an insert
+		# applied after it lands in front of its content instead of inside of
+		# the replaced text
+		return sorted(kept, key=lambda edit: (edit.begin, edit.end > edit.begin, edit.order), reverse=True)
+
+	def apply(self):
+		"""
+		Applies the planned edits to the snapshot, returning the new text
+		"""
+		text = self.text
+		chunks = []
+		end = len(text)
+		for edit in self.edits():
+			chunks.append(text[edit.end:end])
+			chunks.append(edit.content)
+			end = edit.begin
+		chunks.append(text[:end])
+		return ''.join(reversed(chunks))
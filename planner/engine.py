@@ -0,0 +1,664 @@
+import re
+import hashlib
+from datetime import timedelta, datetime, date
+from collections import namedtuple, Counter, OrderedDict
+import math
+from operator import attrgetter, methodcaller, itemgetter
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .edits import EditPlan
+from .models import Task, Section, Statistics, WeeklyEffort
+from .models import human_duration
+from .scheduler import CategoryJob, SchedulingSection, SchedulingTask, schedule_category, job_digest
+from .sidecar import load_schedules, save_schedules
+from .utils import sparkline, truncate_middle, weeknumber, fmtweek, weekordinal
+from .utils import human_duration, StageTimer
+
+# Settings read by PlanCompiler.compile
+COMPILE_SETTINGS = [
+	'default_daily_category_workload',
+	'show_quarters_on_graphs',
+	'section_sampling',
+	'parallel_scheduling_workers',
+	'schedule_cache_sidecar',
+	'report_timings',
+]
+# Settings the compiled text depends on
+OUTPUT_SETTINGS = [
+	'default_daily_category_workload',
+	'show_quarters_on_graphs',
+	'section_sampling',
+	'report_timings',
+]
+
+class CompileCancelled(Exception):
+	pass
+
+CompiledPlan = namedtuple('CompiledPlan', ['text', 'edits', 'sections', 'statistics', 'errors', 'timer', 'counts'])
+
+class PlanCompiler(object):
+	"""PlanCompiler(processes=False)
+
+	Compiles the text of a plan without any editor around it. Keep one
+	instance per document: sections and schedules of the previous compile
+	are reused when they did not change.
+
+	With processes, parallel scheduling runs on worker processes rather
+	than threads. Only a Python interpreter can start those, not the
+	Sublime Text plugin host.
+	"""
+	HEADING_IDENTIFIER = '#'
+	SECTION_IDENTIFIER = '## '
+	INVALID_SECTIONS = [
+		'## Trello warnings',
+		'## Plan:*',
+	]
+
+	def __init__(self, processes=False):
+		self.processes = processes
+		# Sections parsed on the previous run, by their lines
+		self._section_cache = {}
+		# Job digest and schedule of every category on the previous run
+		self._schedule_cache = {}
+		# Sidecar file the schedules are persisted to, if any
+		self._sidecar = None
+		self._sidecar_outdated = False
+		# Fingerprint of the previous output, and the compile it came from
+		self._last_output = None
+
+	def _fingerprint(self, content, settings):
+		"""
+		Hash of everything the compiled text depends on. The whole text is
+		hashed, generated sections included: their headings configure them,
+		and recompiling an unchanged output yields the output itself.
+		"""
+		inputs = [content, str(date.today())] + [repr(settings.get(key)) for key in OUTPUT_SETTINGS]
+		return hashlib.sha1('\0'.join(inputs).encode('utf-8')).hexdigest()
+
+	def compile(self, content, settings, cancelled=None, sidecar=None):
+		"""
+		Compiles content with the given settings, anything with a get(key,
+		default) method such as a dict. Returns a CompiledPlan.
+
+		cancelled is polled between the stages of the compile, which raises
+		CompileCancelled as soon as it returns True.
+
+		sidecar is the path of a file the schedules are kept in between
+		sessions, see sidecar_path(). The first compile loads it, and every
+		compile that schedules something again updates it.
+		"""
+		def check_cancelled():
+			if cancelled is not None and cancelled():
+				raise CompileCancelled()
+
+		fingerprint = self._fingerprint(content, settings)
+		if self._last_output is not None and self._last_output[0] == fingerprint:
+			# Saved again without changes: nothing to do
+			return self._last_output[1]._replace(edits = [], timer = StageTimer())
+
+		# The sections of the previous output are reused and reset below, so it
+		# can't be handed out again until this compile succeeds
+		self._last_output = None
+		self._configure(settings)
+		self._use_sidecar(sidecar)
+
+		with self.timer.stage('parse'):
+			sections = self._extract_sections(content)
+		check_cancelled()
+		with self.timer.stage('statistics'):
+			statistics = self._analyse(sections)
+		check_cancelled()
+		with self.timer.stage('schedule'):
+			self._compute_schedule(sections, statistics)
+		check_cancelled()
+		plan = self._render(content, sections, statistics)
+		check_cancelled()
+
+		with self.timer.stage('apply'):
+			text = plan.apply()
+			edits = plan.edits()
+
+		compiled = CompiledPlan(
+			text = text,
+			edits = edits,
+			sections = sections,
+			statistics = statistics,
+			errors = self.errors,
+			timer = self.timer,
+			counts = self._counts(sections, plan) if self.report_timings else None
+		)
+		self._last_output = (self._fingerprint(compiled.text, settings), compiled)
+
+		return compiled
+
+	def _configure(self, settings):
+		self.errors = []
+		self.myrandomseed = 4567
+		self.show_quarters = settings.get('show_quarters_on_graphs')
+		self.section_sampling = settings.get('section_sampling', 'legacy')
+		self.scheduling_workers = settings.get('parallel_scheduling_workers', 0)
+		self.default_workload = settings.get('default_daily_category_workload', 8 * 60) # 8 hours in minutes
+		self.report_timings = settings.get('report_timings', False)
+		self.timer = StageTimer()
+
+	def _use_sidecar(self, sidecar):
+		if sidecar != self._sidecar:
+			self._sidecar = sidecar
+			self._sidecar_outdated = sidecar is not None
+			if sidecar is not None and not self._schedule_cache:
+				self._schedule_cache = load_schedules(sidecar)
+
+	def _analyse(self, sections):
+		statistics = self._compute_statistics(sections)
+		self._estimate_missing_data(sections, statistics)
+		return statistics
+
+	def _render(self, content, sections, statistics):
+		"""
+		Plans the edits of every generated part of the plan, timing each of
+		them. The information section comes last so it can report the
+		timings.
+		"""
+		stage = self.timer.stage
+
+		with stage('weekly effort'):
+			weekly_effort = WeeklyEffort(sections, statistics.categories)
+		with stage('index'):
+			plan = EditPlan(content)
+		with stage('completed tasks'):
+			self._mark_date_completed(sections, plan)
+		with stage('section timings'):
+			self._update_section_timings(sections, plan, weekly_effort)
+		with stage('upcoming tasks'):
+			self._update_upcoming_tasks(sections, plan, statistics)
+		with stage('planned effort'):
+			self._update_planned_effort(sections, plan, statistics)
+		with stage('weekly schedule'):
+			self._draw_weekly_schedule(sections, plan, weekly_effort)
+		with stage('section schedule'):
+			self._draw_section_schedule(sections, plan, weekly_effort)
+		self._update_timestamp_and_errors(plan, sections)
+		return plan
+
+	def _counts(self, sections, plan):
+		tasks = [task for section in sections for task in section.tasks]
+		slots = sum([span.num_days for task in tasks for spans in task.spans.values() for span in spans])
+		return OrderedDict([('tasks', len(tasks)), ('slots', slots), ('edits', len(plan))])
+
+	def __section_indices(self, lines):
+		SectionIndex = namedtuple('SectionIndex', ['index', 'is_valid'])
+		indices = []
+
+		def is_section_valid(line):
+			if not line.startswith(self.SECTION_IDENTIFIER):
+				return False
+			for invalid_section in self.INVALID_SECTIONS:
+				if re.match(invalid_section, line):
+					return False
+			return True
+
+		for index, line in enumerate(lines):
+			if line.startswith(self.HEADING_IDENTIFIER):
+				indices.append(SectionIndex(index, is_section_valid(line)))
+		indices.append(SectionIndex(len(lines), False))
+
+		return indices
+
+
+	def _extract_sections(self, content):
+		"""
+		Splits the content into sections. Sections whose lines did not change
+		since the previous run are reused instead of being parsed again.
+		"""
+		array = content.split('\n')
+		section_indices = self.__section_indices(array)
+
+		sections = []
+		section_cache = {}
+
+		for idx, sec_idx in enumerate(section_indices):
+			if idx + 1 == len(section_indices): break
+			start_idx = sec_idx.index
+			end_idx = section_indices[idx+1].index
+
+			lines = array[start_idx:end_idx]
+			key = tuple(lines)
+			cached = self._section_cache.get(key)
+			if cached:
+				section = cached.pop()
+				section.row_at = start_idx
+				section.reset_schedule()
+			else:
+				section = Section(
+					lines = lines,
+					is_valid = sec_idx.is_valid,
+					row_at = start_idx
+				)
+
+			section_cache.setdefault(key, []).append(section)
+			sections.append(section)
+
+		self._section_cache = section_cache
+
+		return sections
+
+	def _compute_total_weekly_load(self, section, weekly_effort, for_weeks=40, quarter_breaks=False):
+		weekly_efforts = []
+		QUARTER_CHANGE_DELIMETER = None
+		prev_quarter = None
+		for x in range(for_weeks):
+			dt = date.today() + timedelta(weeks=x)
+			new_quarter = math.ceil(dt.month / 3.) 
+			if quarter_breaks and prev_quarter and prev_quarter != new_quarter:
+				weekly_efforts.append(QUARTER_CHANGE_DELIMETER)
+			weekly_efforts.append(weekly_effort.section_week(section, weekordinal(dt)))
+			prev_quarter = new_quarter
+
+		return weekly_efforts
+
+	def _update_section_timings(self, sections, plan, weekly_effort):
+		"""
+		Below each section write a short summary of number of tasks and
+		planned durations
+		"""
+		SPARK_START = "⌚"
+		for section in sections:
+			if section.is_valid:
+				weekly_load = self._compute_total_weekly_load(section, weekly_effort, quarter_breaks=self.show_quarters)
+				spark = sparkline(weekly_load)
+
+				if section.needs_update:
+					content = section.summary + '\n' + SPARK_START + spark
+					line = plan.row(section.row_at + 1)
+					next_line = plan.row(section.row_at + 2)
+					plan.replace(line[0], next_line[1], content)
+				else:
+					content = '\n' + section.summary + '\n' + SPARK_START + spark
+					line = plan.row(section.row_at)
+					plan.insert(line[1], content)
+
+	def _update_upcoming_tasks(self, sections, plan, statistics):
+		"""
+		Print the top upcoming tasks in the `## Plan: Upcoming tasks` section. 
+		"""
+		DEFAULT_NUM_TASKS = 10
+		NUM_TASKS_PER_CATEGORY = 5
+		UPCOMING_TASKS_SECTION_REGEX = '## Plan: (\d+\s)?[Uu]pcoming tasks'
+		SHOW_TASKS_BY_CATEGORY = True
+
+		sections = [section for section in sections if section.weight > 0]
+
+		index_section = plan.find_heading(UPCOMING_TASKS_SECTION_REGEX)
+		if index_section is None:
+			# Upcoming tasks section is not wanted. Stop.
+			return
+
+		def upcoming_cat_task_group_content(task_group, num_tasks, category):
+			sorted_tasks = sorted(task_group.tasks, key=methodcaller('scheduled_start_date', category))
+
+			sorted_tasks_string = '\n\n### ' + task_group.title + ' upcoming tasks\n\n' if task_group.show_title else ''
+			sorted_tasks_string += '\n'.join([str(task) for task in sorted_tasks[:num_tasks]])
+
+			if len(sorted_tasks) == 0:
+				sorted_tasks_string += 'There are not tasks in this category'
+
+			return sorted_tasks_string
+
+		line = plan.line(index_section[0])
+		section_title = plan.substr(line)
+		match = re.search('(?P<num_tasks>\d+)', section_title)
+
+		default_num_tasks = int(match.group('num_tasks')) if match else DEFAULT_NUM_TASKS
+
+		nested_tasks = [section.tasks for section in sections]
+
+		UpcomingTaskGroup = namedtuple('UpcomingTaskGroup', ['title', 'tasks', 'show_title'])
+
+		all_tasks = [task for tasks in nested_tasks for task in tasks if task.is_mandatory]
+		upcoming_task_groups = [
+			UpcomingTaskGroup(
+				show_title = False,
+				title = 'All',
+				tasks = all_tasks
+			)
+		]
+
+		for category in statistics.categories:
+			upcoming_task_groups.append(UpcomingTaskGroup(
+				title = category if category else 'Uncategorized',
+				show_title = True,
+				tasks = list(filter(lambda task: task.has_category(category), all_tasks))
+			))
+
+		upcoming_task_groups.append(UpcomingTaskGroup(
+			title = 'Deadlined',
+			show_title = True,
+			tasks = list(filter(lambda task: task.has_deadline, all_tasks))	
+		))
+
+		all_task_groups_content = []
+		for task_group in upcoming_task_groups:
+			num_tasks = NUM_TASKS_PER_CATEGORY if task_group.show_title else default_num_tasks
+			all_task_groups_content.append(upcoming_cat_task_group_content(task_group, num_tasks, task_group.title))
+
+		next_section_index = plan.next_heading(line[1], '## ')
+		plan.replace(line[1], next_section_index, '\n\n' + ''.join(all_task_groups_content) + '\n\n')
+
+	def _content_for_total_effort_chart(self, sections):
+		durations = [section.duration[2] for section in sections]
+		summed_durations = sum(
+			(Counter(dict(x)) for x in durations),
+			Counter())
+		max_key_length = max([len(key) for key in summed_durations.keys()])
+		max_value = max([value for value in summed_durations.values()])
+		sorted_summed_durations = sorted(summed_durations.items(), key=itemgetter(1), reverse=True)
+
+		durations_chart = []
+		scale_factor = 30/max_value
+		for category, duration in sorted_summed_durations:
+			hum_duration = human_duration(duration, Section.DURATION_MAP, max_segments=2)
+			chart_format = "%" + str(max_key_length) + "s %6s %s"
+			chart_row = chart_format % (category, hum_duration, "#" * int(duration * scale_factor))
+			durations_chart.append(chart_row)
+
+		effort_content = '```\n' + '\n'.join(durations_chart) + '\n```'
+		return effort_content
+
+	def _update_planned_effort(self, sections, plan, statistics):
+
+
+		heading_region = plan.find_heading('^## Plan: Total estimated effort')
+		if heading_region is None:
+			return
+
+		effort_content = self._content_for_total_effort_chart(sections)
+
+		line = plan.line(heading_region[0])
+		next_section_index = plan.next_heading(line[1])
+		plan.replace(line[1], next_section_index, '\n\n' + effort_content + '\n\n')
+
+	def _compute_statistics(self, sections):
+		"""
+		Computes statistics to avoid computing it several times later
+		"""
+
+		return Statistics(sections, self.default_workload)
+
+	def _estimate_missing_data(self, sections, stats):
+		"""
+		Fill-in the gaps: task duration.
+		"""
+		for section in sections:
+			for task in section.tasks:
+				for category in task.categories():
+					if not task.category_duration(category, fake_valid=False):
+						task.set_fake_duration(category, stats.get_mean_duration(category))
+
+	def _category_jobs(self, sections, statistics):
+		"""
+		Describes the scheduling input of every category, together with the
+		tasks the resulting spans belong to
+		"""
+		today = date.today()
+		category_tasks = OrderedDict([(category, []) for category in statistics.categories])
+		category_sections = dict([(category, OrderedDict()) for category in statistics.categories])
+
+		for section in sections:
+			for task in section.tasks:
+				for category in task.categories():
+					job_sections = category_sections[category]
+					if section not in job_sections:
+						job_sections[section] = len(job_sections)
+					category_tasks[category].append((task, SchedulingTask(
+						section = job_sections[section],
+						pos = task.pos,
+						end_date = task.meta.end_date,
+						duration = task.category_duration(category),
+						description = task.description,
+						label = str(task)
+					)))
+
+		jobs = []
+		for category, tasks in category_tasks.items():
+			job = CategoryJob(
+				category = category,
+				max_load = statistics.max_load_for_category(category),
+				today = today,
+				seed = self.myrandomseed,
+				section_sampling = self.section_sampling,
+				sections = tuple([SchedulingSection(section.title, section.pretty_title, section.weight) for section in category_sections[category]]),
+				tasks = tuple([job_task for task, job_task in tasks])
+			)
+			jobs.append((job, [task for task, job_task in tasks]))
+		return jobs
+
+	def _run_category_jobs(self, jobs):
+		"""
+		Schedules the categories serially, or on a pool of worker processes,
+		or threads without processes, when parallel scheduling is enabled.
+		Results are in the order of jobs.
+		"""
+		workers = self.scheduling_workers
+		if workers and workers > 1 and len(jobs) > 1 and not self.processes:
+			with ThreadPoolExecutor(max_workers=workers) as executor:
+				return list(executor.map(schedule_category, jobs))
+
+		if workers and workers > 1 and len(jobs) > 1:
+			try:
+				with ProcessPoolExecutor(max_workers=workers) as executor:
+					return list(executor.map(schedule_category, jobs))
+			except (OSError, ImportError, BrokenProcessPool, pickle.PicklingError) as e:
+				print('ProjectPlanner: parallel scheduling failed ({}), scheduling serially'.format(e))
+
+		return [schedule_category(job) for job in jobs]
+
+	def _compute_schedule(self, sections, statistics):
+		"""
+		Only categories whose job differs from the previous run are
+		scheduled again. A job holds every input of the category schedule,
+		including today's date, so an equal job yields an equal schedule.
+		Jobs are compared by digest, which also identifies the schedules
+		loaded from a sidecar.
+		"""
+		sections = [section for section in sections if section.weight > 0]
+
+		jobs = self._category_jobs(sections, statistics)
+
+		digests = dict([(job.category, job_digest(job)) for job, tasks in jobs])
+		cached_schedules = {}
+		for job, tasks in jobs:
+			cached = self._schedule_cache.get(job.category)
+			if cached is not None and cached[0] == digests[job.category]:
+				cached_schedules[job.category] = cached[1]
+
+		stale_jobs = [job for job, tasks in jobs if job.category not in cached_schedules]
+		schedules = dict(zip([job.category for job in stale_jobs], self._run_category_jobs(stale_jobs)))
+		schedules.update(cached_schedules)
+
+		changed = stale_jobs or len(self._schedule_cache) != len(jobs) or self._sidecar_outdated
+		self._schedule_cache = {}
+		for job, tasks in jobs:
+			schedule = schedules[job.category]
+			self._schedule_cache[job.category] = (digests[job.category], schedule)
+
+			for task, spans in zip(tasks, schedule.spans):
+				task.set_spans_for_category(job.category, spans)
+			for category, error in schedule.errors:
+				self.add_error(category, error)
+
+		if self._sidecar is not None and changed:
+			try:
+				save_schedules(self._sidecar, self._schedule_cache)
+				self._sidecar_outdated = False
+			except (IOError, OSError) as e:
+				print('ProjectPlanner: could not write the schedule cache {} ({})'.format(self._sidecar, e))
+
+	def _mark_date_completed(self, sections, plan):
+		DATE_MARKER = "@done"
+		STRIKE = "~~"
+		for section in sections:
+			for row, task in section.completed_task_rows():
+				has_date = task.find(DATE_MARKER) != -1
+				has_strike = task.find(STRIKE) != -1
+				if has_date and has_strike:
+					continue
+				line = plan.row(row)
+				if not has_strike:
+					plan.insert(line[0] + 2, STRIKE)
+				if not has_date:
+					formatted_marker = " %s(%s)" % (DATE_MARKER, date.today())
+					plan.insert(line[1], formatted_marker)
+				if not has_strike:
+					plan.insert(line[1], STRIKE)
+
+	def _draw_weekly_schedule(self, sections, plan, weekly_effort):
+
+		heading_region = plan.find_heading('^## Plan: (\d+w? )?Week(.+) effort timeline')
+		if heading_region is None:
+			return
+
+		line = plan.line(heading_region[0])
+
+		match = re.search('(?P<num_weeks>\d+)', plan.substr(line))
+		for_weeks = int(match.group('num_weeks')) if match else 10
+
+		max_weekly_effort = weekly_effort.max_category_week()
+
+		effort_content = '{:<7}  '.format('')
+		effort_content += "".join(["{:<5}  ".format(cat) for cat in weekly_effort.categories ]) + '\n'
+
+		max_chars = 5
+		for x in range(for_weeks):
+			dt = date.today() + timedelta(weeks=x)
+			effort_content += '{:<7}  '.format(fmtweek(dt))
+			for category in weekly_effort.categories:
+				hours = weekly_effort.category_week(category, weekordinal(dt))
+				if hours is not None:
+					week_eff = '|' * (round(hours / max_weekly_effort * max_chars))
+				else:
+					week_eff = ''
+				effort_content += '{:<5}  '.format(week_eff)
+			effort_content += '\n'
+
+		next_section_index = plan.next_heading(line[1])
+		plan.replace(line[1], next_section_index, '\n\n```\n' + effort_content + '```\n\n')
+
+	def _draw_section_schedule(self, sections, plan, weekly_effort, to_scale=False):
+
+		heading_region = plan.find_heading('^## Plan: (\d+w )?[Ss]ection schedule')
+		if heading_region is None:
+			return
+
+		line = plan.line(heading_region[0])
+
+		match = re.search('(?P<num_weeks>\d+).+', plan.substr(line))
+		for_weeks = int(match.group('num_weeks')) if match else 30
+		for_weeks = min(for_weeks, 60)
+
+		match = re.search('.+(?P<to_scale>to scale)\s*', plan.substr(line))
+		to_scale = True if match and match.group('to_scale') else to_scale
+
+		data = []
+		smallest = 0
+		largest = 40
+		for section in sections:
+			if section.is_valid:
+				weekly_load = self._compute_total_weekly_load(section, weekly_effort, for_weeks=for_weeks, quarter_breaks=self.show_quarters)
+				largest = max(largest, max([w for w in weekly_load if w is not None]))
+				data.append((weekly_load, section.title[3:]))
+
+		MAX_WIDTH = 76
+		title_width = MAX_WIDTH - for_weeks - 1
+		title_width -= len([w for w in weekly_load if w is None])
+
+		fmt_string = '{:<' + str(title_width) + '} {}\n'
+
+		if not to_scale:
+			largest = 40
+
+		effort_content = ''
+		for x in range(len(data)):
+			weekly_load, section_title = data[x]
+			spark = sparkline(weekly_load, smallest=smallest, largest=largest)
+			effort_content += fmt_string.format(truncate_middle(section_title, title_width), spark)
+
+		next_section_index = plan.next_heading(line[1])
+		plan.replace(line[1], next_section_index, '\n\n```\n' + effort_content + '```\n\n')
+
+	def add_error(self, category, error):
+		exists = [err for err in self.errors if err['category'] == category]
+
+		if exists:
+			exists[0]['errors'].append(error)
+		else:
+			self.errors.append({
+				'category': category,
+				'errors': [error]
+			})
+
+	def _errors_content(self):
+		content = ''
+		if len(self.errors) > 0:
+			content = '\n\nThere are errors in your plan:\n\n'
+			for errorgroup in self.errors:
+				content += '*{}*:\n'.format(errorgroup['category'])
+				for error in errorgroup['errors']:
+					content += '- {}\n'.format(error)
+				content += '\n'
+		else:
+			content = '\n\n'
+
+		return content
+
+	def _timings_content(self, sections, plan):
+		counts = ', '.join(['{} {}'.format(count, name) for name, count in self._counts(sections, plan).items()])
+		return 'Compiled in {:.3f}s ({}) for {}'.format(self.timer.total, self.timer.summary(), counts)
+
+	def _update_timestamp_and_errors(self, plan, sections):
+
+		heading_region = plan.find_heading(re.escape('## Plan: Information'))
+
+		if heading_region is None:
+			return
+
+		line = plan.line(heading_region[0])
+
+		next_section_index = plan.next_heading(line[1])
+		content = 'Last updated: {}'.format(datetime.now().strftime("%Y-%m-%d"))
+		if self.report_timings == 'plan':
+			content += '\n' + self._timings_content(sections, plan)
+
+		content += self._errors_content()
+
+		plan.replace(line[1], next_section_index, '\n\n' + content)
+
+def schedule_data(compiled):
+	"""
+	The schedule of a compiled plan as plain data, ready to be dumped as JSON
+	"""
+	def span_data(span):
+		return {
+			'start': span.start.date().isoformat(),
+			'end': span.end.date().isoformat(),
+			'days': span.days,
+			'hours': span.hours,
+			'remainder': span.remainder
+		}
+
+	sections = []
+	for section in compiled.sections:
+		if not section.is_valid:
+			continue
+		sections.append({
+			'title': section.pretty_title,
+			'tasks': [{
+				'task': task.description,
+				'spans': dict([(category, [span_data(span) for span in spans]) for category, spans in task.spans.items()])
+			} for task in section.tasks]
+		})
+
+	return {
+		'sections': sections,
+		'errors': compiled.errors
+	}
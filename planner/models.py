@@ -4,8 +4,7 @@ from datetime import timedelta, datetime, date
 from collections import defaultdict
 from collections import namedtuple, Counter
 from operator import attrgetter, itemgetter
-import sublime, sublime_plugin
-from .utils import human_duration, mean, extract_task_metadata, to_minutes
+from .utils import human_duration, mean, tokenize_task, to_minutes, add_weekdays, weekordinal
 
 class DaySlot(object):
 	"""WorkDay(date, hours)"""
@@ -16,30 +15,201 @@ class DaySlot(object):
 	def __repr__(self):
 		return "%s - %d hours" % (self.date, self.hours)
 
+class DaySpan(object):
+	"""DaySpan(start, days, hours, remainder)
+
+	Run of `days` consecutive working days with `hours` each, starting at
+	`start`, followed by one more working day with `remainder` hours
+	"""
+	FRIDAY = 4
+
+	def __init__(self, start, days, hours, remainder=0):
+		self.start = start
+		self.days = days
+		self.hours = hours
+		self.remainder = remainder
+
+	@property
+	def num_days(self):
+		return self.days + 1 if self.remainder else self.days
+
+	@property
+	def end(self):
+		return add_weekdays(self.start, self.num_days - 1)
+
+	@property
+	def total(self):
+		return self.days * self.hours + self.remainder
+
+	def extend(self, dt, hours):
+		"""
+		Appends the working day following the span, if it fits
+		"""
+		if self.remainder or self.start.weekday() > self.FRIDAY:
+			return False
+		if dt != add_weekdays(self.start, self.days):
+			return False
+
+		if hours == self.hours:
+			self.days += 1
+		elif hours:
+			self.remainder = hours
+		else:
+			return False
+		return True
+
+	def extend_back(self, dt, hours):
+		"""
+		Prepends the working day preceding the span, if it fits
+		"""
+		if dt.weekday() > self.FRIDAY or add_weekdays(dt, 1) != self.start:
+			return False
+
+		if hours == self.hours:
+			self.days += 1
+		elif self.days == 1 and not self.remainder and self.hours:
+			self.remainder = self.hours
+			self.hours = hours
+		else:
+			return False
+		self.start = dt
+		return True
+
+	def slots(self):
+		for day in range(self.days):
+			yield DaySlot(add_weekdays(self.start, day), self.hours)
+		if self.remainder:
+			yield DaySlot(add_weekdays(self.start, self.days), self.remainder)
+
+	def weekly_hours(self):
+		"""
+		Yields (first day in week, hours) for each week the span covers
+		"""
+		cur_dt = self.start
+		days = self.days
+		while days > 0:
+			week_days = min(days, self.FRIDAY + 1 - cur_dt.weekday()) if cur_dt.weekday() <= self.FRIDAY else 1
+			yield (cur_dt, week_days * self.hours)
+			cur_dt = add_weekdays(cur_dt, week_days)
+			days -= week_days
+		if self.remainder:
+			yield (cur_dt, self.remainder)
+
+	def __repr__(self):
+		return "%s - %d days of %d hours + %d hours" % (self.start, self.days, self.hours, self.remainder)
+
+	@classmethod
+	def from_slots(cls, slots):
+		"""
+		Compresses chronologically ordered slots into spans
+		"""
+		spans = []
+		for slot in slots:
+			if not spans or not spans[-1].extend(slot.date, slot.hours):
+				spans.append(cls(slot.date, 1, slot.hours))
+		return spans
+
+class CapacityLedger(object):
+	"""CapacityLedger(max_effort)
+
+	Effort already allocated to a single category, keyed by day
+	"""
+	FRIDAY = 4
+
+	def __init__(self, max_effort):
+		self.max_effort = max_effort
+		self._allocated = {}
+		# Full days, each with a later day up to which all working days are full
+		self._skip = {}
+
+	def allocated(self, dt):
+		return self._allocated.get(dt.date(), 0)
+
+	def remaining(self, dt):
+		return self.max_effort - self.allocated(dt)
+
+	def allocate(self, dt, hours):
+		day = dt.date()
+		if hours and day in self._skip:
+			# A full day changed, the skips over it are no longer valid
+			self._skip = {}
+		self._allocated[day] = self._allocated.get(day, 0) + hours
+
+	def first_available(self, dt):
+		"""
+		First working day from dt on, dt being a working day, that still has
+		effort left. Runs of full days are skipped in one step once walked.
+		"""
+		day = dt.date()
+		full_days = []
+		while self.max_effort - self._allocated.get(day, 0) == 0:
+			full_days.append(day)
+			next_day = self._skip.get(day)
+			if next_day is None:
+				next_day = day + timedelta(days=3 if day.weekday() == self.FRIDAY else 1)
+			day = next_day
+		for full_day in full_days:
+			self._skip[full_day] = day
+		return dt + (day - dt.date())
+
+class WeeklyEffort(object):
+	"""WeeklyEffort(sections, categories)
+
+	Scheduled hours per section, category and week, computed once per
+	compile. Weeks are identified by weekordinal().
+	"""
+	def __init__(self, sections, categories):
+		self.categories = categories
+		self._effort = {}
+		self._section_totals = {}
+		self._category_totals = dict([(category, {}) for category in categories])
+
+		for section in sections:
+			section_effort = dict([(category, {}) for category in categories])
+			for task in section.tasks:
+				for category, spans in task.spans.items():
+					weeks = section_effort[category]
+					for span in spans:
+						for week_dt, hours in span.weekly_hours():
+							week = weekordinal(week_dt)
+							weeks[week] = weeks.get(week, 0) + hours
+			self._effort[section] = section_effort
+
+			section_totals = {}
+			for category, weeks in section_effort.items():
+				category_totals = self._category_totals[category]
+				for week, hours in weeks.items():
+					section_totals[week] = section_totals.get(week, 0) + hours
+					category_totals[week] = category_totals.get(week, 0) + hours
+			self._section_totals[section] = section_totals
+
+	def effort(self, section, category, week):
+		return self._effort[section][category].get(week, 0)
+
+	def section_week(self, section, week):
+		return self._section_totals.get(section, {}).get(week, 0)
+
+	def category_week(self, category, week):
+		"""
+		Hours of the category in the week, or None if nothing is scheduled
+		"""
+		return self._category_totals[category].get(week)
+
+	def max_category_week(self):
+		return max([0] + [hours for weeks in self._category_totals.values() for hours in weeks.values()])
+
 class Task(object):
 	"""Task(raw)"""
 
 	DATE_FORMAT = '%Y-%m-%d'
 
 	def __init__(self, raw, section, section_order):
-		
-		def extract_description(task):
-			TASK_META_MATCH_REGEX = '\[(?P<flags>M\s?)?(?P<categories>(\d+\w\s?)?(\w+)?(\w+\s\d+\w\s?)*)(?P<end_date>\d{4}-\d{2}-\d{2})?\]$'
-			meta_index = re.search(TASK_META_MATCH_REGEX, task)
-
-			# Strips the initial -/+ sign
-			if meta_index:
-				description = task[2:meta_index.start()]
-			else:
-				description = task[2:]
-
-			return description.strip()
-
-		self._raw = raw 
-		self._meta, self._raw_meta = extract_task_metadata(raw)
-		self._description = extract_description(raw)
+		self._raw = raw
+		self._tokens = tokenize_task(raw)
+		self._meta, self._raw_meta = self._tokens.meta, self._tokens.raw_meta
+		self._description = self._tokens.description
 		self._fake_duration = {}
-		self.slots = {}
+		self.spans = {}
 		self._section = section
 		self._pos = section_order
 		self._depends_on = None
@@ -74,34 +244,46 @@ class Task(object):
 		"""
 		Mathes task without links without meta without
 		"""
-		name = self._description.strip()
-		# Remove the trello link if any
-		if name[0] == '[' and name[-1] == ')':
-			name = re.search('\[(?P<name>.+)\].+', name).group('name')
-		return name
+		return self._tokens.name
 
 	@property
 	def is_trello_card(self):
-		CARD_ID_REGEX = 'https\:\/\/trello\.com\/c\/(?P<card_id>.+)\/'
-		return re.search(CARD_ID_REGEX, self.raw) is not None
+		return self._tokens.card_id is not None
 
 	@property
 	def trello_url(self):
-		CARD_ID_REGEX = 'https\:\/\/trello\.com\/c\/(?P<card_id>.+)\/'
-		return re.search(CARD_ID_REGEX, self.raw).group(0)
+		return self._tokens.card_url
 
 	@property
 	def trello_id(self):
-		CARD_ID_REGEX = 'https\:\/\/trello\.com\/c\/(?P<card_id>.+)\/'
-		match = re.search(CARD_ID_REGEX, self.raw)
-		if not match: return None  
-		return match.group('card_id')
+		return self._tokens.card_id
+
+	def reset_schedule(self):
+		"""
+		Forgets everything computed by a previous compile
+		"""
+		self._fake_duration = {}
+		self.spans = {}
+		self._depends_on = None
+		self._prerequirement_for = None
+
+	def set_spans_for_category(self, category, spans):
+		self.spans[category] = spans
+
+	def get_spans_for_category(self, category):
+		return self.spans[category] if category in self.spans else []
 
 	def set_slots_for_category(self, category, slots):
-		self.slots[category] = slots
+		slots = sorted(slots, key=attrgetter('date'))
+		self.set_spans_for_category(category, DaySpan.from_slots(slots))
 
 	def get_slots_for_category(self, category):
-		return self.slots[category] if category in self.slots else []
+		return [slot for span in self.get_spans_for_category(category) for slot in span.slots()]
+
+	def _spans_for(self, category):
+		if category in ['All', 'Deadlined']:
+			return [span for cat in self.categories() for span in self.get_spans_for_category(cat)]
+		return self.get_spans_for_category(category)
 
 	@property
 	def is_mandatory(self):
@@ -126,31 +308,13 @@ class Task(object):
 		"""
 		Date-precesion of task start date
 		"""
-
-		slots = []
-		if category in ['All', 'Deadlined']:
-			for cat in self.categories():
-				slots += self.get_slots_for_category(cat)
-		else:
-			slots = self.get_slots_for_category(category)
-			
-		all_dates = [s.date for s in slots]
-		return min(all_dates)
+		return min([span.start for span in self._spans_for(category)])
 
 	def scheduled_end_date(self, category):
 		"""
 		Date-precision of task end date.
 		"""
-
-		slots = []
-		if category in ['All', 'Deadlined']:
-			for cat in self.categories():
-				slots += self.get_slots_for_category(cat)
-		else:
-			slots = self.get_slots_for_category(category)
-
-		all_dates = [s.date for s in slots]
-		return max(all_dates)
+		return max([span.end for span in self._spans_for(category)])
 
 	@property
 	def has_deadline(self):
@@ -221,12 +385,12 @@ class Task(object):
 		if category == 'All':
 			# Take largest urgency from all categories
 			# Use overall 
-			cats_deadlines = [self.get_slots_for_category(cat)[0].date for cat in self.meta.categories.keys()]
+			cats_deadlines = [self.get_spans_for_category(cat)[0].start for cat in self.meta.categories.keys()]
 			return urgency_normalizer(max(cats_deadlines))
 		elif not self.has_category(category):
 			return 0 # just in case
 		else:
-			return urgency_normalizer(self.get_slots_for_category(category)[0].date)
+			return urgency_normalizer(self.get_spans_for_category(category)[0].start)
 
 	@property
 	def raw(self):
@@ -304,6 +468,14 @@ class Section(object):
 	def row_at(self):
 		return self._row_at
 
+	@row_at.setter
+	def row_at(self, row):
+		self._row_at = row
+
+	def reset_schedule(self):
+		for task in self.all_tasks:
+			task.reset_schedule()
+
 	@property
 	def needs_update(self):
 		return self.lines[1].startswith('[')
@@ -342,6 +514,13 @@ class Section(object):
 		is_completed_task = lambda line: line.startswith(self.COMPLETED_TASK_IDENTIFIER)
 		return [line for line in self.lines if is_completed_task(line)]
 
+	def completed_task_rows(self):
+		"""
+		Completed tasks together with their row in the document
+		"""
+		is_completed_task = lambda line: line.startswith(self.COMPLETED_TASK_IDENTIFIER)
+		return [(self.row_at + index, line) for index, line in enumerate(self.lines) if is_completed_task(line)]
+
 	@property
 	def tasks(self):
 		return self._tasks
@@ -390,9 +569,10 @@ class Section(object):
 		return self.title < other.title
 
 class Statistics(object):
-	"""Statistics(sections)"""
-	def __init__(self, sections):
+	"""Statistics(sections, default_workload)"""
+	def __init__(self, sections, default_workload=8 * 60):
 		self.sections = sections
+		self.default_workload = default_workload
 		self.all_tasks = self._compute_alltasks(sections)
 		self.categories = self._compute_categories()
 		self.category_means = self._compute_category_means()
@@ -401,10 +581,7 @@ class Statistics(object):
 	def _extract_category_overrides(self):
 		CONFIG_SECTION_TITLE = '## Plan: Configuration'
 		CONFIG_WORKLOAD_TASK = 'Daily Workload'
-		conf = sublime.load_settings('ProjectPlanner.sublime-settings')
-		default_workload = conf.get('default_daily_category_workload', 8 * 60) # 8 hours in minutes
-
-		workloads_dict = defaultdict(lambda: default_workload)
+		workloads_dict = defaultdict(lambda: self.default_workload)
 
 		config_section = [sec for sec in self.sections if sec.title == CONFIG_SECTION_TITLE]
 		if len(config_section) == 0:
@@ -0,0 +1,72 @@
+import os
+import io
+import time
+import functools
+from contextlib import contextmanager
+
+DEFAULT_TOP = 20
+
+@contextmanager
+def profiled(name, output_dir, top=DEFAULT_TOP, memory=False):
+	"""
+	Profiles the block with cProfile, writes the stats to
+	output_dir/<name>-<time>.prof and prints the `top` functions by
+	cumulative time. With memory, a tracemalloc snapshot is written next
+	to the stats and its largest allocations are printed too.
+	"""
+	# Imported on first use, this module is loaded with the plugin
+	import cProfile, pstats
+	try:
+		import tracemalloc
+	except ImportError:
+		# Python < 3.4
+		tracemalloc = None
+
+	trace_memory = memory and tracemalloc is not None
+	if memory and not trace_memory:
+		print('ProjectPlanner: tracemalloc is not available, profiling time only')
+	started_tracing = trace_memory and not tracemalloc.is_tracing()
+	if started_tracing:
+		tracemalloc.start()
+
+	profile = cProfile.Profile()
+	profile.enable()
+	try:
+		yield
+	finally:
+		profile.disable()
+		snapshot = tracemalloc.take_snapshot() if trace_memory else None
+		if started_tracing:
+			tracemalloc.stop()
+
+		if not os.path.isdir(output_dir):
+			os.makedirs(output_dir)
+		path = os.path.join(output_dir, '{}-{}'.format(name, time.strftime('%Y%m%d-%H%M%S')))
+
+		profile.dump_stats(path + '.prof')
+		stream = io.StringIO()
+		pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(top)
+		print('ProjectPlanner: profile of {} written to {}.prof\n{}'.format(name, path, stream.getvalue()))
+
+		if snapshot is not None:
+			snapshot.dump(path + '.tracemalloc')
+			statistics = snapshot.statistics('lineno')[:top]
+			print('ProjectPlanner: memory snapshot of {} written to {}.tracemalloc\n{}\n'.format(name, path, '\n'.join([str(stat) for stat in statistics])))
+
+def profiled_command(name, load_settings):
+	"""
+	Decorates the run method of a command to profile it while the
+	`profiling` setting is on. load_settings returns the settings.
+	"""
+	def decorate(run):
+		@functools.wraps(run)
+		def wrapper(*args, **kwargs):
+			settings = load_settings()
+			if not settings.get('profiling', False):
+				return run(*args, **kwargs)
+
+			output_dir = settings.get('profiling_output_dir') or os.path.join(os.path.expanduser('~'), '.projectplanner-profiles')
+			with profiled(name, os.path.expanduser(output_dir), settings.get('profiling_top', DEFAULT_TOP), settings.get('profiling_memory', False)):
+				return run(*args, **kwargs)
+		return wrapper
+	return decorate
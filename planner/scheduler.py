@@ -0,0 +1,321 @@
+import random
+import hashlib
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import timedelta, datetime
+from .models import DaySpan, CapacityLedger
+from .utils import next_available_weekday, listdiff, FenwickTree
+
+# Scheduling works on plain tuples instead of Task and Section objects, so
+# that a category can be shipped to a worker process and scheduled there
+SchedulingSection = namedtuple('SchedulingSection', ['title', 'pretty_title', 'weight'])
+SchedulingTask = namedtuple('SchedulingTask', ['section', 'pos', 'end_date', 'duration', 'description', 'label'])
+CategoryJob = namedtuple('CategoryJob', ['category', 'max_load', 'today', 'seed', 'section_sampling', 'sections', 'tasks'])
+CategorySchedule = namedtuple('CategorySchedule', ['category', 'spans', 'errors'])
+
+def job_digest(job):
+	"""
+	Digest of every input of a category schedule
+	"""
+	return hashlib.sha1(repr(job).encode('utf-8')).hexdigest()
+
+def schedule_category(job):
+	"""
+	Schedules all tasks of job.category. Returns the spans of every task
+	in job.tasks order, and the errors in the order they were found.
+	"""
+	return CategoryScheduler(job).run()
+
+class DeadlineIndex(object):
+	"""DeadlineIndex(tasks)
+
+	Deadlined tasks of every section, sorted by position
+	"""
+	def __init__(self, tasks):
+		self._tasks = {}
+		self._positions = {}
+
+		for index, task in enumerate(tasks):
+			if task.end_date is None:
+				continue
+			self._tasks.setdefault(task.section, []).append(index)
+			self._positions.setdefault(task.section, []).append(task.pos)
+
+	def tasks(self, section):
+		return self._tasks.get(section, [])
+
+	def previous(self, task):
+		if task.section not in self._positions:
+			return None
+		index = bisect_left(self._positions[task.section], task.pos)
+		return self._tasks[task.section][index - 1] if index > 0 else None
+
+	def next(self, task):
+		if task.section not in self._positions:
+			return None
+		index = bisect_right(self._positions[task.section], task.pos)
+		tasks = self._tasks[task.section]
+		return tasks[index] if index < len(tasks) else None
+
+class CategoryScheduler(object):
+	"""CategoryScheduler(job)
+
+	Tasks are referred to by their index in job.tasks
+	"""
+	def __init__(self, job):
+		self.job = job
+		self.tasks = job.tasks
+		self.category = job.category
+		self.max_load = job.max_load
+		self.ledger = CapacityLedger(job.max_load)
+		self.deadline_index = DeadlineIndex(job.tasks)
+		self.spans = [[] for task in job.tasks]
+		self.errors = []
+		self.depends_on = {}
+		self.prerequirement_for = {}
+
+	def add_error(self, category, error):
+		self.errors.append((category, error))
+
+	def scheduled_start_date(self, index):
+		return min([span.start for span in self.spans[index]])
+
+	def scheduled_end_date(self, index):
+		return max([span.end for span in self.spans[index]])
+
+	def _schedule_task_with_deadline(self, index, available_before_date, available_effort):
+		"""
+		The scheduler is only precise to the day,
+		but will make sure you nevere have more than max_effort hours in
+		any single day
+		"""
+		MONDAY=0
+		FRIDAY=4
+		SATURDAY=5
+		SUNDAY=6
+
+		task = self.tasks[index]
+		max_effort = self.max_load
+
+		if available_effort <= 0:
+			available_effort += max_effort
+			available_before_date -= timedelta(days=1)
+
+		# Define end_date
+		if task.end_date is not None and task.end_date < available_before_date:
+			end_date = task.end_date
+			available_effort = self.ledger.remaining(end_date)
+		else:
+			# print('SCHEDULE INFO: Task %s will have to begin earlier due to later tasks taking long' % (task,))
+			end_date = available_before_date
+
+		# Skip saturday & sunday
+		if end_date.weekday() == SATURDAY:
+			end_date -= timedelta(days=1)
+		elif end_date.weekday() == SUNDAY: # this should never really happen
+			end_date -= timedelta(days=2)
+
+		# Deadlines are midnights, so a deadline of today is already past
+		if end_date.date() <= self.job.today:
+			self.add_error('Past deadline', '"{}" ({}) should have been completed by {}'.format(task.description, self.category, end_date.date()))
+
+		duration = int(task.duration)
+
+
+		spans = []
+		cur_dt = end_date
+		while duration > 0:
+			block_duration = min(available_effort, duration)
+			if not spans or not spans[-1].extend_back(cur_dt, block_duration):
+				spans.append(DaySpan(cur_dt, 1, block_duration))
+			self.ledger.allocate(cur_dt, block_duration)
+			available_effort -= block_duration
+			duration -= block_duration
+			if available_effort == 0:
+				cur_dt = next_available_weekday(cur_dt)
+				available_effort = max_effort
+
+		self.spans[index] = spans[::-1]
+
+		return (cur_dt, available_effort)
+
+	def _schedule_task_wout_deadline(self, index, first_available_date, completed_before_date=None):
+		MONDAY=0
+		FRIDAY=4
+		SATURDAY=5
+		SUNDAY=6
+
+		task = self.tasks[index]
+		duration = task.duration
+
+		# Don't plan work for weekends
+		if first_available_date.weekday() == SATURDAY:
+			first_available_date += timedelta(days=2)
+		elif first_available_date.weekday() == SUNDAY: # this should never really happen
+			first_available_date += timedelta(days=1)
+
+		def next_available_weekday(dt):
+			MONDAY=0
+			FRIDAY=4
+			SATURDAY=5
+			SUNDAY=6
+			if dt.weekday() == FRIDAY:
+				delta = timedelta(days=3)
+			elif dt.weekday() == SATURDAY:
+				delta = timedelta(days=2)
+			else:
+				delta = timedelta(days=1)
+			return dt + delta
+
+
+		spans = []
+		cur_dt = first_available_date
+		while duration > 0:
+			cur_dt = self.ledger.first_available(cur_dt)
+			remaing_effort = self.ledger.remaining(cur_dt)
+
+			allocate_effort = min(remaing_effort, duration)
+
+			hours = int(allocate_effort)
+			if not spans or not spans[-1].extend(cur_dt, hours):
+				spans.append(DaySpan(cur_dt, 1, hours))
+			self.ledger.allocate(cur_dt, hours)
+			duration -= allocate_effort
+
+			if duration > 0:
+				cur_dt = next_available_weekday(cur_dt)
+
+		if completed_before_date is not None and completed_before_date < cur_dt:
+			prerequirement_for = self.tasks[self.prerequirement_for[index]]
+			self.add_error('Prerequirement mismatch', '{}: "{}" should have been completed before {}. Instead it will be done by {}'.format(self.category, task.description, prerequirement_for.label, cur_dt.date()))
+
+		self.spans[index] = spans
+
+		# FIXME: It it be returning the cur_dt?
+		return first_available_date
+
+	def _prioritize_tasks(self, tasks_wout_deadline):
+		"""
+		reoader tasks_wout_deadline based on the section probabilitisc
+		weights
+		"""
+		sections = set([self.tasks[index].section for index in tasks_wout_deadline])
+		sections = sorted(list(sections), key=lambda section: (self.job.sections[section].title, section)) # order the set, for limited randomness
+
+		section_tasks = dict([(section, []) for section in sections])
+		for index in sorted(tasks_wout_deadline):
+			section_tasks[self.tasks[index].section].append(index)
+		section_tasks = [section_tasks[section] for section in sections]
+		sections = [self.job.sections[section] for section in sections]
+		myrandom = random.Random(self.job.seed)
+
+		if self.job.section_sampling == 'weighted':
+			return self._interleave_section_tasks(sections, section_tasks, myrandom)
+
+		# Legacy order: the generator used to be re-seeded before every draw,
+		# so each section always drew the same key and the sections were
+		# drained one after another, highest key first
+		section_keys = [(myrandom.random() * section.weight, section.title, index) for index, section in enumerate(sections)]
+
+		prioritized_tasks = []
+		for key, title, index in sorted(section_keys, reverse=True):
+			prioritized_tasks += section_tasks[index]
+
+		return prioritized_tasks
+
+	def _interleave_section_tasks(self, sections, section_tasks, myrandom):
+		"""
+		Draws the tasks one by one, picking the section of each draw with a
+		probability proportional to its weight
+		"""
+		weights = [section.weight for section in sections]
+		tree = FenwickTree(weights)
+		next_task = [0] * len(sections)
+		remaining = sum([len(tasks) for tasks in section_tasks])
+
+		prioritized_tasks = []
+		while remaining > 0:
+			index = tree.find(myrandom.random() * tree.total())
+			if index >= len(sections) or next_task[index] == len(section_tasks[index]):
+				# Rounding left a tiny weight behind a drained section
+				index = [i for i in range(len(sections)) if next_task[i] < len(section_tasks[i])][0]
+
+			prioritized_tasks.append(section_tasks[index][next_task[index]])
+			next_task[index] += 1
+			remaining -= 1
+			if next_task[index] == len(section_tasks[index]):
+				tree.add(index, -weights[index])
+
+		return prioritized_tasks
+
+	def _check_correct_deadlined_task_ordering(self):
+		for section_index, section in enumerate(self.job.sections):
+			section_tasks = [self.tasks[index] for index in self.deadline_index.tasks(section_index)]
+
+			for i in range(len(section_tasks) - 1):
+				if section_tasks[i].end_date > section_tasks[i+1].end_date:
+					self.add_error(
+						'Incorrect ordering of tasks with deadline',
+						'{}: Task *{}* with deadline {} should be placed after task *{}* with deadline {} '.format(
+								section.pretty_title,
+								section_tasks[i].description,
+								section_tasks[i].end_date.date(),
+								section_tasks[i+1].description,
+								section_tasks[i+1].end_date.date()
+							)
+						)
+
+	def run(self):
+		"""
+		End date is understood such, that max_load can be done also on that day
+
+		Steps:
+		1. Place all deadlined tasks the latest possible - ensure deadlines OK
+		2. Place all prerequisites the soonest possible - ensure deadlines OK
+		3. Place everything else based on priorities - play with fire
+
+		Thus 2 levels of errors:
+		CRITICAL: deadlined task cannot be finished
+		SEVERE: preconditioned task cannot be finished
+		"""
+		last_available_date = datetime(2999, 12, 12)
+		remaing_effort = self.max_load
+		indices = range(len(self.tasks))
+		tasks_w_deadline = [i for i in indices if self.tasks[i].end_date is not None]
+
+		self._check_correct_deadlined_task_ordering()
+
+		tasks_w_deadline = sorted(tasks_w_deadline, key=lambda i: self.tasks[i].end_date, reverse=True)
+		tasks_wout_deadline = [i for i in indices if self.tasks[i].end_date is None]
+		tasks_wout_deadline = self._prioritize_tasks(tasks_wout_deadline)
+		tasks_preconditioned = []
+
+		for index in tasks_w_deadline:
+			(last_available_date, remaing_effort) = self._schedule_task_with_deadline(index, last_available_date, remaing_effort)
+
+		# Step 2: Place all prerequisites the soonest possible
+		# First, find all prerequisites tasks
+		for index in tasks_wout_deadline:
+			prerequirement_for = self.deadline_index.next(self.tasks[index])
+			if prerequirement_for is not None:
+				self.prerequirement_for[index] = prerequirement_for
+				self.depends_on[index] = self.deadline_index.previous(self.tasks[index])
+				tasks_preconditioned.append(index)
+
+		# Second, schedule them
+		tasks_preconditioned = self._prioritize_tasks(tasks_preconditioned)
+		first_available_date = datetime.combine(self.job.today, datetime.min.time())
+		for index in tasks_preconditioned:
+			depends_on = self.depends_on[index]
+			after = first_available_date if depends_on is None else self.scheduled_end_date(depends_on)
+
+			before = self.scheduled_start_date(self.prerequirement_for[index]) # end of day
+			new_first_available_date = self._schedule_task_wout_deadline(index, after, before)
+			first_available_date = new_first_available_date if depends_on is None else first_available_date
+
+		# Step 3: Place all remaining tasks based on priorities
+		tasks_wout_deadline = listdiff(tasks_wout_deadline, tasks_preconditioned)
+		for index in tasks_wout_deadline:
+			first_available_date = self._schedule_task_wout_deadline(index, first_available_date)
+
+		return CategorySchedule(self.category, self.spans, self.errors)
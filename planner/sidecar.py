@@ -0,0 +1,56 @@
+import os
+import json
+from datetime import datetime
+from .models import DaySpan
+from .scheduler import CategorySchedule
+from .utils import write_atomically
+
+# Bump whenever the layout below changes, older sidecars are then ignored
+SIDECAR_VERSION = 1
+
+def sidecar_path(plan_path):
+	"""
+	The schedule cache of a plan is a hidden file next to it
+	"""
+	directory, name = os.path.split(plan_path)
+	return os.path.join(directory, '.' + name + '.schedule.json')
+
+def _parse_datetime(value):
+	fmt = '%Y-%m-%dT%H:%M:%S.%f' if '.' in value else '%Y-%m-%dT%H:%M:%S'
+	return datetime.strptime(value, fmt)
+
+def load_schedules(path):
+	"""
+	Schedules of every category by category, as (job digest, schedule).
+	A missing, unreadable or outdated sidecar yields no schedules.
+	"""
+	try:
+		with open(path, encoding='utf-8') as f:
+			data = json.load(f)
+		if data.get('version') != SIDECAR_VERSION:
+			return {}
+
+		schedules = {}
+		for entry in data['schedules']:
+			spans = [[DaySpan(_parse_datetime(start), days, hours, remainder) for start, days, hours, remainder in task_spans] for task_spans in entry['spans']]
+			errors = [(category, error) for category, error in entry['errors']]
+			schedules[entry['category']] = (entry['digest'], CategorySchedule(entry['category'], spans, errors))
+		return schedules
+	except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError):
+		return {}
+
+def save_schedules(path, schedules):
+	"""
+	Writes the schedules, as returned by load_schedules, to path
+	"""
+	entries = []
+	for category, (digest, schedule) in schedules.items():
+		entries.append({
+			'category': category,
+			'digest': digest,
+			'spans': [[[span.start.isoformat(), span.days, span.hours, span.remainder] for span in task_spans] for task_spans in schedule.spans],
+			'errors': [list(error) for error in schedule.errors]
+		})
+
+	data = {'version': SIDECAR_VERSION, 'schedules': entries}
+	write_atomically(path, json.dumps(data, separators=(',', ':')))
@@ -0,0 +1,69 @@
+import os
+import json
+from .utils import write_atomically
+
+# Bump whenever the layout below changes, older caches are then ignored
+TRELLO_CACHE_VERSION = 1
+
+def responses_cache_path(cache_dir):
+	"""
+	The Trello responses are kept next to the cached boards
+	"""
+	return os.path.join(cache_dir, 'ProjectPlanner', 'trello-responses.json')
+
+def board_cache_path(cache_dir, board_id):
+	"""
+	The cached board of a Trello sync lives in the cache folder of the editor
+	"""
+	return os.path.join(cache_dir, 'ProjectPlanner', 'trello-board-{}.json'.format(board_id))
+
+def load_board_snapshot(path):
+	"""
+	The BoardSnapshot saved at path. A missing, unreadable or outdated cache
+	yields None.
+	"""
+	from ..lib.trollop import BoardSnapshot
+	try:
+		with open(path, encoding='utf-8') as f:
+			data = json.load(f)
+		if data.get('version') != TRELLO_CACHE_VERSION:
+			return None
+		return BoardSnapshot.from_dict(data['snapshot'])
+	except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError):
+		return None
+
+def save_board_snapshot(path, snapshot):
+	"""
+	Writes the BoardSnapshot to path
+	"""
+	directory = os.path.dirname(path)
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	data = {'version': TRELLO_CACHE_VERSION, 'snapshot': snapshot.to_dict()}
+	write_atomically(path, json.dumps(data, separators=(',', ':')))
+
+def load_responses(path, owner):
+	"""
+	The (key, CacheEntry) pairs of the ResponseCache saved at path, if it was
+	saved by owner. A missing, unreadable or outdated cache yields none.
+	"""
+	from ..lib.trollop import CacheEntry
+	try:
+		with open(path, encoding='utf-8') as f:
+			data = json.load(f)
+		if data.get('version') != TRELLO_CACHE_VERSION or data.get('owner') != owner:
+			return []
+		return [(key, CacheEntry(stored_at, etag, text)) for key, stored_at, etag, text in data['entries']]
+	except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError):
+		return []
+
+def save_responses(path, cache):
+	"""
+	Writes the entries of the ResponseCache to path
+	"""
+	directory = os.path.dirname(path)
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	entries = [[key, entry.stored_at, entry.etag, entry.text] for key, entry in cache.entries()]
+	data = {'version': TRELLO_CACHE_VERSION, 'owner': cache.owner, 'entries': entries}
+	write_atomically(path, json.dumps(data, separators=(',', ':')))
@@ -0,0 +1,333 @@
+from datetime import timedelta, datetime, date
+from operator import attrgetter, methodcaller, itemgetter
+import re
+import os
+import time
+import shutil
+import tempfile
+from contextlib import contextmanager
+from collections import namedtuple, OrderedDict
+
+def to_minutes(durstr, duration_map):
+	value = durstr[:-1]
+	unit = durstr[-1]
+	return int(value) * duration_map[unit]
+
+def listdiff(a, b):
+    b = set(b)
+    return [aa for aa in a if aa not in b]
+
+def sparkline(values, smallest=-1, largest=-1):
+	"""
+	Treats null values are quarter breaks
+	"""
+	if len(values) == 0:
+		return ''
+
+	original_values = values
+	ticks = ['▁', '▂', '▃', '▄', '▅', '▆', '▇']
+	values = [float(val) for val in values if val is not None]
+	smallest = min(values) if smallest == -1 else smallest
+	largest = max(values) if largest == -1 else largest
+	rng = largest - smallest
+	scale = len(ticks) - 1
+
+	if rng == 0:
+		rng = largest - 0
+
+	if rng != 0:
+		return ''.join([  ticks[min(scale, round(((val - smallest) / rng) * scale))] if val is not None else '│'for val in original_values  ])
+	else:
+		return ''.join([ticks[0] for val in original_values])
+
+
+def truncate_middle(s, n):
+	if len(s) <= n:
+		# string is already short-enough
+		return s
+	# half of the size, minus the 3 .'s
+	n_2 = int(int(n) / 2 - 3)
+	# whatever's left
+	n_1 = int(n - n_2 - 3)
+
+	return '{0}...{1}'.format(s[:n_1], s[-n_2:])
+
+
+def weeknumber(datetime):
+	return datetime.date().isocalendar()[1]
+
+def fmtweek(datetime):
+	(year, week) = datetime.isocalendar()[:2]
+	return '%04dW%02d' % (year, week)
+
+def weekordinal(dt):
+	"""
+	Identifies the week of a date by the ordinal of its monday
+	"""
+	return dt.toordinal() - dt.weekday()
+
+def next_available_weekday(dt):
+	MONDAY=0
+	SUNDAY=6
+
+	if dt.weekday() == MONDAY:
+		# Skip weekends
+		delta = timedelta(days=3)
+	elif dt.weekday() == SUNDAY:
+		# Skip weekends
+		delta = timedelta(days=2)
+	else:
+		delta = timedelta(days=1)
+	return dt - delta
+
+def add_weekdays(dt, days):
+	"""
+	Moves a working day forward by the given number of working days
+	"""
+	FRIDAY=4
+
+	weeks, days = divmod(days, 5)
+	dt += timedelta(weeks=weeks)
+	if days and dt.weekday() + days > FRIDAY:
+		# Skip weekends
+		days += 2
+	return dt + timedelta(days=days)
+
+def human_duration(total_duration, duration_categories_map, max_segments=5):
+	groupped_duration = dict.fromkeys(duration_categories_map.keys(), 0)
+
+	duration_categories = sorted(duration_categories_map.items(), key=itemgetter(1), reverse=True)
+	duration_categories = [d[0] for d in duration_categories]
+
+	for duration_cat in duration_categories:
+		# groupped_duration[duration_cat] = int(round(total_duration / duration_categories_map[duration_cat]))
+		groupped_duration[duration_cat] = total_duration // duration_categories_map[duration_cat]
+		total_duration -= groupped_duration[duration_cat] * duration_categories_map[duration_cat]
+
+	human_time = ' '.join(["%d%s" % (groupped_duration[cat], cat) for cat in duration_categories if groupped_duration[cat] > 0])
+
+	# Cro out low precision (this should be smarte rounding)
+	if max_segments < len(human_time.split(' ')):
+		human_time = ' '.join(human_time.split(' ')[:max_segments])
+
+	return human_time
+
+def mean(values):
+	if len(values) == 0: return None
+	return sum(values) / len(values)
+
+
+TaskMeta = namedtuple('TaskMeta', ['optional', 'categories', 'end_date'])
+TaskTokens = namedtuple('TaskTokens', ['meta', 'raw_meta', 'description', 'name', 'card_id', 'card_url'])
+
+TASK_META_REGEX = re.compile(r'\[((?P<flags>M)(?![a-zA-Z])\s?)?(?P<categories>(\d+\w\s?)?(\w{3,})?(\w{3,}\s\d+\w\s?)*)(?P<end_date>\d{4}-\d{2}-\d{2})?\]$')
+# Looser than TASK_META_REGEX: also strips brackets which are not valid meta
+DESCRIPTION_META_REGEX = re.compile(r'\[(?P<flags>M\s?)?(?P<categories>(\d+\w\s?)?(\w+)?(\w+\s\d+\w\s?)*)(?P<end_date>\d{4}-\d{2}-\d{2})?\]$')
+CATEGORY_REGEX = re.compile(r'(?P<cat>[a-zA-Z]{3,})?\s?(?P<duration>\d+(m|h|d|w|M|q))?')
+CARD_URL_PREFIX = 'https://trello.com/c/'
+CARD_ID_REGEX = re.compile(r'https\:\/\/trello\.com\/c\/(?P<card_id>.+)\/')
+LINK_NAME_REGEX = re.compile(r'\[(?P<name>.+)\].+')
+
+def has_optional_flag(string):
+	return string is not None and "M" in string
+
+def extract_categories(string):
+	"""
+	30m
+	5w
+	Math 2w
+	Math 3d Jap 9w
+	Bio
+	"""
+
+	categories = {}
+
+	for match in CATEGORY_REGEX.finditer(string):
+		if not (match.group('duration') is None and match.group('cat') is None):
+
+			cat = str(match.group('cat'))
+			categories[cat] = {}
+			if match.group('duration'):
+				dur = int(match.group('duration')[:-1])
+				unit = match.group('duration')[-1]
+			else:
+				dur = None
+				unit = None
+
+			categories[cat]['duration_value'] = dur,
+			categories[cat]['duration_unit'] = unit
+
+	return categories
+
+def parse_end_date(str):
+	DATE_FORMAT = '%Y-%m-%d'
+	return datetime.strptime(str, DATE_FORMAT) if str else None
+
+def match_trailing_meta(regex, task):
+	"""
+	The meta block cannot contain brackets, so a match of the end-anchored
+	regex can only start at the last opening bracket of the line
+	"""
+	start = task.rfind('[')
+	return regex.match(task, start) if start != -1 else None
+
+def extract_task_metadata(task):
+	matches = match_trailing_meta(TASK_META_REGEX, task)
+
+	if matches:
+
+		optional = has_optional_flag(matches.group('flags'))
+		categories = extract_categories(matches.group('categories'))
+
+		end_date = parse_end_date(matches.group('end_date'))
+
+		meta = TaskMeta(
+			optional,
+			categories,
+			end_date
+		)
+		raw_meta = matches.group(0)
+	else:
+		raw_meta = ""
+		categories = {}
+		categories['None'] = {}
+		categories['None']['duration_value'] = None,
+		categories['None']['duration_unit'] = None
+		meta = TaskMeta(False, categories, None)
+
+	return (meta, raw_meta)
+
+def tokenize_task(task):
+	"""
+	Parses a task line into its meta, description, name and Trello card
+	"""
+	meta, raw_meta = extract_task_metadata(task)
+
+	# Strips the initial -/+ sign
+	if raw_meta:
+		description = task[2:-len(raw_meta)]
+	else:
+		meta_index = match_trailing_meta(DESCRIPTION_META_REGEX, task)
+		description = task[2:meta_index.start()] if meta_index else task[2:]
+	description = description.strip()
+
+	# Remove the trello link if any
+	name = description
+	link_match = LINK_NAME_REGEX.search(name) if name[:1] == '[' and name[-1:] == ')' else None
+	if link_match:
+		name = link_match.group('name')
+
+	card_id = None
+	card_url = None
+	if CARD_URL_PREFIX in task:
+		card_match = CARD_ID_REGEX.search(task)
+		if card_match:
+			card_id = card_match.group('card_id')
+			card_url = card_match.group(0)
+
+	return TaskTokens(meta, raw_meta, description, name, card_id, card_url)
+
+
+def weighted_sampling_without_replacement(l, n, myrandom=None):
+	"""Selects without replacement n random elements from a list of (weight, item) tuples."""
+
+	if myrandom:
+		l = sorted((myrandom.random() * x[0], x[1]) for x in l)
+	else:
+		import random
+		l = sorted((random.random() * x[0], x[1]) for x in l)
+
+	return l[-n:]
+
+
+class FenwickTree(object):
+	"""FenwickTree(weights)
+
+	Prefix sums of a list of weights, with O(log n) updates and lookups
+	"""
+	def __init__(self, weights):
+		self._size = len(weights)
+		self._tree = [0] + list(weights)
+		for index in range(1, self._size + 1):
+			parent = index + (index & -index)
+			if parent <= self._size:
+				self._tree[parent] += self._tree[index]
+
+	def add(self, index, delta):
+		index += 1
+		while index <= self._size:
+			self._tree[index] += delta
+			index += index & -index
+
+	def total(self):
+		total = 0
+		index = self._size
+		while index > 0:
+			total += self._tree[index]
+			index -= index & -index
+		return total
+
+	def find(self, value):
+		"""
+		Index of the first weight whose prefix sum exceeds value
+		"""
+		pos = 0
+		step = 1 << (self._size.bit_length() - 1) if self._size else 0
+		while step:
+			if pos + step <= self._size and self._tree[pos + step] <= value:
+				pos += step
+				value -= self._tree[pos]
+			step >>= 1
+		return pos
+
+def _read_umask():
+	# The umask can only be read by setting another one, for every thread of
+	# the process at once, so it is read once on import
+	umask = os.umask(0o022)
+	os.umask(umask)
+	return umask
+
+UMASK = _read_umask()
+
+def write_atomically(path, content):
+	"""
+	Writes content next to path and moves it over path, so readers never
+	see a half written file. The file keeps its permissions, and content is
+	written as is, without translating line endings.
+	"""
+	fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path), suffix='.tmp', dir=os.path.dirname(path) or '.')
+	try:
+		with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+			f.write(content)
+		if os.path.exists(path):
+			shutil.copymode(path, temp_path)
+		else:
+			# mkstemp makes the file private, give it the usual permissions
+			os.chmod(temp_path, 0o666 & ~UMASK)
+		os.replace(temp_path, path)
+	except:
+		os.remove(temp_path)
+		raise
+
+class StageTimer(object):
+	"""StageTimer()
+
+	Wall time spent in every stage, in the order the stages first ran
+	"""
+	def __init__(self):
+		self.timings = OrderedDict()
+
+	@contextmanager
+	def stage(self, name):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.timings[name] = self.timings.get(name, 0) + time.perf_counter() - start
+
+	@property
+	def total(self):
+		return sum(self.timings.values())
+
+	def summary(self):
+		return ', '.join(['{} {:.3f}s'.format(name, seconds) for name, seconds in self.timings.items()])
@@ -0,0 +1,124 @@
+import os, sys
+import json
+import copy
+import unittest
+import importlib
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+trollop = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.lib.trollop')
+
+BOARD = {
+	'id': 'B1',
+	'name': 'Board',
+	'lists': [{'id': 'L1', 'name': 'To do'}, {'id': 'L2', 'name': 'Done'}],
+	'cards': [
+		{'id': 'C1', 'idBoard': 'B1', 'idList': 'L1', 'name': 'One', 'closed': False, 'pos': 1},
+		{'id': 'C2', 'idBoard': 'B1', 'idList': 'L1', 'name': 'Two', 'closed': False, 'pos': 2},
+	],
+	'checklists': [{'id': 'K1', 'idCard': 'C1', 'checkItems': [{'id': 'I1', 'state': 'incomplete'}]}],
+}
+CURSOR = {'id': 'A0', 'date': '2024-01-01T00:00:00.000Z'}
+
+def snapshot():
+	return trollop.BoardSnapshot('B1', copy.deepcopy(BOARD), dict(CURSOR))
+
+def action(action_id, action_type, **data):
+	return {'id': action_id, 'date': '2024-01-02T00:00:{:02d}.000Z'.format(int(action_id[1:])), 'type': action_type, 'data': data}
+
+class FakeResponse(object):
+
+	def __init__(self, text):
+		self.status_code = 200
+		self.text = text
+		self.headers = {}
+
+	def raise_for_status(self):
+		pass
+
+class FakeSession(object):
+
+	def __init__(self, responses):
+		self.responses = responses
+
+	def request(self, method, url, data=None, headers=None):
+		# The sublist prefixes end with a slash, which Trello ignores
+		path = url[len('https://api.trello.com/1'):].split('?')[0].rstrip('/')
+		return FakeResponse(json.dumps(self.responses[path]))
+
+def card(snapshot, card_id):
+	return [card for card in snapshot.cards if card['id'] == card_id]
+
+class ApplyTest(unittest.TestCase):
+
+	def test_card_update(self):
+		board = snapshot()
+		self.assertTrue(board.apply(action('A1', 'updateCard', card={'id': 'C1', 'idList': 'L2'}, old={'idList': 'L1'})))
+		self.assertEqual(card(board, 'C1')[0]['idList'], 'L2')
+
+	def test_card_update_without_the_changed_fields(self):
+		board = snapshot()
+		self.assertFalse(board.apply(action('A1', 'updateCard', card={'id': 'C1'}, old={'idLabels': []})))
+
+	def test_check_item_state(self):
+		board = snapshot()
+		self.assertTrue(board.apply(action('A1', 'updateCheckItemStateOnCard', checklist={'id': 'K1'}, checkItem={'id': 'I1', 'state': 'complete'})))
+		self.assertEqual(board.checklists[0]['checkItems'][0]['state'], 'complete')
+		self.assertFalse(board.apply(action('A2', 'updateCheckItemStateOnCard', checklist={'id': 'K9'}, checkItem={'id': 'I9', 'state': 'complete'})))
+
+	def test_deleted_card_goes_with_its_checklists(self):
+		board = snapshot()
+		self.assertTrue(board.apply(action('A1', 'deleteCard', card={'id': 'C1'})))
+		self.assertEqual(card(board, 'C1'), [])
+		self.assertEqual(board.checklists, [])
+
+	def test_ignored_and_unknown_actions(self):
+		board = snapshot()
+		self.assertTrue(board.apply(action('A1', 'commentCard', card={'id': 'C1'})))
+		self.assertFalse(board.apply(action('A2', 'createCard', card={'id': 'C3'})))
+		self.assertEqual(board.to_dict(), snapshot().to_dict())
+
+	def test_dict_round_trip(self):
+		board = snapshot()
+		restored = trollop.BoardSnapshot.from_dict(json.loads(json.dumps(board.to_dict())))
+		self.assertEqual(restored.to_dict(), board.to_dict())
+
+class UpdateTest(unittest.TestCase):
+
+	def connection(self, responses):
+		conn = trollop.TrelloConnection('key', 'token', 1)
+		conn._local.session = FakeSession(responses)
+		return conn
+
+	def test_actions_are_replayed_and_missing_data_fetched(self):
+		new_card = {'id': 'C3', 'idBoard': 'B1', 'idList': 'L1', 'name': 'Three', 'pos': 3, 'checklists': [{'id': 'K3', 'idCard': 'C3', 'checkItems': []}]}
+		actions = [
+			action('A3', 'createCard', card={'id': 'C3'}),
+			action('A2', 'updateCard', card={'id': 'C2', 'name': 'Renamed'}, old={'name': 'Two'}),
+			action('A1', 'createList', list={'id': 'L3'}),
+			dict(action('A0', 'commentCard'), **CURSOR),
+		]
+		lists = BOARD['lists'] + [{'id': 'L3', 'name': 'New'}]
+		conn = self.connection({'/boards/B1/actions': actions, '/cards/C3': new_card, '/boards/B1/lists': lists})
+
+		board = conn.update_board_snapshot(snapshot())
+		self.assertEqual(card(board, 'C2')[0]['name'], 'Renamed')
+		self.assertEqual(card(board, 'C3')[0]['name'], 'Three')
+		self.assertEqual([checklist['id'] for checklist in board.checklists], ['K1', 'K3'])
+		self.assertEqual(board.lists, lists)
+		self.assertEqual(board.cursor, {'id': 'A3', 'date': actions[0]['date']})
+
+	def test_nothing_new(self):
+		conn = self.connection({'/boards/B1/actions': [dict(action('A0', 'commentCard'), **CURSOR)]})
+		board = snapshot()
+		self.assertIs(conn.update_board_snapshot(board), board)
+		self.assertEqual(board.to_dict(), snapshot().to_dict())
+
+	def test_too_many_actions_are_not_replayed(self):
+		actions = [action('A1', 'commentCard')] * trollop.BoardSnapshot.MAX_ACTIONS
+		conn = self.connection({'/boards/B1/actions': actions})
+		self.assertIsNone(conn.update_board_snapshot(snapshot()))
+
+if __name__ == '__main__':
+	unittest.main()
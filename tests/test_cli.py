@@ -0,0 +1,74 @@
+import os, sys
+import io
+import shutil
+import tempfile
+import unittest
+import importlib
+import contextlib
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+cli = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.cli')
+
+class DecodeSettingsTest(unittest.TestCase):
+
+	def test_comments_and_trailing_commas(self):
+		text = '\n'.join([
+			'{',
+			'\t// a comment, with "quotes"',
+			'\t"url": "http://example.com // not a comment, }",',
+			'\t/* a block',
+			'\t   comment */',
+			'\t"workers": 2, // trailing',
+			'\t"list": [1, 2, ],',
+			'\t"escaped": "a \\" // still a string",',
+			'}',
+		])
+		self.assertEqual(cli.decode_settings(text), {
+			'url': 'http://example.com // not a comment, }',
+			'workers': 2,
+			'list': [1, 2],
+			'escaped': 'a " // still a string',
+		})
+
+	def test_errors_point_at_the_right_line(self):
+		with self.assertRaises(ValueError) as raised:
+			cli.decode_settings('{\n/* two\nlines */\n"a": 1\n"b": 2\n}')
+		self.assertIn('line 5', str(raised.exception))
+
+	def test_shipped_settings_decode(self):
+		settings = cli.load_settings([cli.DEFAULT_SETTINGS])
+		self.assertIn('parallel_scheduling_workers', settings)
+
+class LoadSettingsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def write(self, name, text):
+		path = os.path.join(self.folder, name)
+		with open(path, 'w', encoding='utf-8') as f:
+			f.write(text)
+		return path
+
+	def test_later_files_override_earlier_ones(self):
+		first = self.write('first.sublime-settings', '{"a": 1, "b": 1}')
+		second = self.write('second.sublime-settings', '{"b": 2, // comment\n}')
+		self.assertEqual(cli.load_settings([first, second]), {'a': 1, 'b': 2})
+
+	def test_invalid_settings_are_a_usage_error(self):
+		path = self.write('broken.sublime-settings', '{"a": 1 "b": 2}')
+		for settings in [path, os.path.join(self.folder, 'missing.sublime-settings')]:
+			stderr = io.StringIO()
+			with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit) as raised:
+				cli.main(['--settings', settings, 'plan.projectplan.md'])
+			self.assertEqual(raised.exception.code, 2)
+			self.assertIn('invalid settings', stderr.getvalue())
+			self.assertIn(os.path.basename(settings), stderr.getvalue())
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,86 @@
+import os, sys
+import random
+import unittest
+import importlib
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+edits = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.edits')
+
+def apply_like_the_view(text, planned_edits):
+	"""
+	Applies the edits one by one in the given order, as
+	ProjectPlannerCompile._apply_edits does with view.replace
+	"""
+	for edit in planned_edits:
+		text = text[:edit.begin] + edit.content + text[edit.end:]
+	return text
+
+class EditPlanTest(unittest.TestCase):
+
+	def assertApplied(self, plan, expected):
+		self.assertEqual(plan.apply(), expected)
+		self.assertEqual(apply_like_the_view(plan.text, plan.edits()), expected)
+
+	def test_edits_run_from_the_end(self):
+		plan = edits.EditPlan('abcdef')
+		plan.replace(0, 1, 'A')
+		plan.replace(4, 6, 'EF')
+		plan.insert(2, '-')
+		self.assertEqual([edit.begin for edit in plan.edits()], [4, 2, 0])
+		self.assertApplied(plan, 'Ab-cdEF')
+
+	def test_last_planned_overlapping_edit_wins(self):
+		plan = edits.EditPlan('abcdef')
+		plan.replace(1, 4, 'X')
+		plan.replace(2, 5, 'Y')
+		self.assertEqual(len(plan.edits()), 1)
+		self.assertApplied(plan, 'abYf')
+
+	def test_inserts_at_the_same_offset_keep_their_order(self):
+		plan = edits.EditPlan('abc')
+		plan.insert(1, '1')
+		plan.insert(1, '2')
+		plan.insert(1, '3')
+		self.assertApplied(plan, 'a123bc')
+
+	def test_insert_at_the_start_of_a_replaced_region(self):
+		plan = edits.EditPlan('abcdef')
+		plan.replace(1, 3, 'XY')
+		plan.insert(1, 'Z')
+		self.assertApplied(plan, 'aZXYdef')
+
+		plan = edits.EditPlan('abcdef')
+		plan.insert(1, 'Z')
+		plan.replace(1, 3, 'XY')
+		self.assertApplied(plan, 'aZXYdef')
+
+	def test_insert_at_the_end_of_a_replaced_region(self):
+		plan = edits.EditPlan('abcdef')
+		plan.replace(1, 3, 'XY')
+		plan.insert(3, 'Z')
+		self.assertApplied(plan, 'aXYZdef')
+
+	def test_apply_matches_the_view(self):
+		myrandom = random.Random(0)
+		for run in range(200):
+			text = ''.join([myrandom.choice('ab\n') for index in range(30)])
+			plan = edits.EditPlan(text)
+			for index in range(myrandom.randint(1, 8)):
+				begin = myrandom.randint(0, len(text))
+				end = min(len(text), begin + myrandom.choice([0, 0, 1, 3, 6]))
+				plan.replace(begin, end, str(index) * myrandom.randint(0, 3))
+			self.assertEqual(plan.apply(), apply_like_the_view(text, plan.edits()))
+
+	def test_rows_and_headings(self):
+		plan = edits.EditPlan('# Plan\ntext\n## Section\nmore')
+		self.assertEqual(plan.num_rows, 4)
+		self.assertEqual(plan.substr(plan.row(2)), '## Section')
+		self.assertEqual(plan.substr(plan.line(9)), 'text')
+		self.assertEqual(plan.next_heading(1), 12)
+		self.assertEqual(plan.substr(plan.find_heading('Sec.*')), 'Section')
+		self.assertIsNone(plan.find_heading('text'))
+
+if __name__ == '__main__':
+	unittest.main()
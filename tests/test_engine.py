@@ -0,0 +1,85 @@
+import os, sys
+import unittest
+import importlib
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+engine = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.engine')
+
+with open(os.path.join(PACKAGE_DIR, 'example.projectplan.md'), encoding='utf-8') as f:
+	EXAMPLE = f.read()
+
+class ParallelSchedulingTest(unittest.TestCase):
+
+	def compile(self, workers, processes=False):
+		return engine.PlanCompiler(processes).compile(EXAMPLE, {'parallel_scheduling_workers': workers})
+
+	def test_threads_schedule_like_serial(self):
+		serial = self.compile(0)
+		parallel = self.compile(4)
+		self.assertEqual(parallel.text, serial.text)
+		self.assertEqual(parallel.errors, serial.errors)
+
+	def test_processes_schedule_like_serial(self):
+		serial = self.compile(0)
+		parallel = self.compile(4, processes=True)
+		self.assertEqual(parallel.text, serial.text)
+		self.assertEqual(parallel.errors, serial.errors)
+
+	def test_no_processes_unless_allowed(self):
+		# The Sublime Text plugin host can't start them
+		process_pool = engine.ProcessPoolExecutor
+		def fail(*args, **kwargs):
+			self.fail('a process pool was started')
+		engine.ProcessPoolExecutor = fail
+		try:
+			self.compile(4)
+		finally:
+			engine.ProcessPoolExecutor = process_pool
+
+class CompileSkipTest(unittest.TestCase):
+
+	def scheduled_tasks(self, compiled):
+		return len([task for section in compiled.sections for task in section.tasks if task.spans])
+
+	def settle(self, compiler, settings):
+		compiled = compiler.compile(EXAMPLE, settings)
+		return compiler.compile(compiled.text, settings)
+
+	def test_unchanged_output_is_not_compiled_again(self):
+		compiler = engine.PlanCompiler()
+		settled = self.settle(compiler, {})
+		compiled = compiler.compile(settled.text, {})
+		self.assertEqual(compiled.text, settled.text)
+		self.assertEqual(compiled.edits, [])
+		# Skipped, so no stage ran
+		self.assertEqual(list(compiled.timer.timings), [])
+
+	def test_changed_settings_compile_again(self):
+		compiler = engine.PlanCompiler()
+		settled = self.settle(compiler, {})
+		compiled = compiler.compile(settled.text, {'default_daily_category_workload': 60})
+		self.assertNotEqual(list(compiled.timer.timings), [])
+		self.assertNotEqual(compiled.text, settled.text)
+
+	def test_cancelled_compile_is_not_skipped_to(self):
+		compiler = engine.PlanCompiler()
+		settled = self.settle(compiler, {})
+		scheduled_tasks = self.scheduled_tasks(settled)
+		stages = []
+		def cancelled():
+			stages.append(None)
+			return len(stages) > 1
+		with self.assertRaises(engine.CompileCancelled):
+			compiler.compile(EXAMPLE + '\n', {}, cancelled=cancelled)
+
+		# The sections of the settled output were reset by the cancelled
+		# compile, so it is compiled again in full
+		compiled = compiler.compile(settled.text, {})
+		self.assertEqual(compiled.text, settled.text)
+		self.assertEqual(compiled.errors, settled.errors)
+		self.assertEqual(self.scheduled_tasks(compiled), scheduled_tasks)
+
+if __name__ == '__main__':
+	unittest.main()
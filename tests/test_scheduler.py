@@ -0,0 +1,160 @@
+import os, sys
+import random
+import unittest
+import importlib
+from datetime import datetime, timedelta
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+models = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.models')
+scheduler = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.scheduler')
+utils = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.utils')
+
+MONDAY = datetime(2024, 1, 1)
+TODAY = MONDAY.date()
+
+class WalkingLedger(models.CapacityLedger):
+	"""
+	The ledger as it was before runs of full days were skipped: the
+	scheduler walked every full day one by one
+	"""
+	def first_available(self, dt):
+		while self.remaining(dt) == 0:
+			dt = utils.add_weekdays(dt, 1)
+		return dt
+
+def random_job(seed, num_tasks=300, num_sections=6, max_load=6):
+	"""
+	A category job with tasks of random sections and durations, a tenth of
+	them with a deadline, increasing within their section
+	"""
+	myrandom = random.Random(seed)
+	sections = tuple([scheduler.SchedulingSection('S{}'.format(index), 'S{}'.format(index), myrandom.choice([0.5, 1, 2, 3])) for index in range(num_sections)])
+	deadlines = [MONDAY] * num_sections
+	tasks = []
+	for pos in range(num_tasks):
+		section = myrandom.randrange(num_sections)
+		end_date = None
+		if myrandom.random() < 0.1:
+			deadlines[section] += timedelta(days=myrandom.randint(1, 30))
+			end_date = deadlines[section]
+		tasks.append(scheduler.SchedulingTask(section, pos, end_date, myrandom.randint(1, 40), 'Task {}'.format(pos), 'Task {}'.format(pos)))
+	return scheduler.CategoryJob('Dev', max_load, TODAY, 4567, myrandom.choice(['legacy', 'weighted']), sections, tuple(tasks))
+
+def slots(schedule):
+	return [[(slot.date, slot.hours) for span in spans for slot in span.slots()] for spans in schedule.spans]
+
+class CapacityLedgerTest(unittest.TestCase):
+
+	def test_skips_full_days(self):
+		ledger = models.CapacityLedger(6)
+		for day in range(3):
+			ledger.allocate(MONDAY + timedelta(days=day), 6)
+		self.assertEqual(ledger.first_available(MONDAY), MONDAY + timedelta(days=3))
+
+		ledger.allocate(MONDAY + timedelta(days=3), 6)
+		ledger.allocate(MONDAY + timedelta(days=4), 6)
+		# Over the weekend
+		self.assertEqual(ledger.first_available(MONDAY), MONDAY + timedelta(days=7))
+		self.assertEqual(ledger.first_available(MONDAY + timedelta(days=2)), MONDAY + timedelta(days=7))
+
+	def test_available_day_is_returned_as_is(self):
+		ledger = models.CapacityLedger(6)
+		ledger.allocate(MONDAY, 2)
+		self.assertEqual(ledger.first_available(MONDAY), MONDAY)
+		self.assertEqual(ledger.remaining(MONDAY), 4)
+
+	def test_skips_are_dropped_when_a_full_day_changes(self):
+		ledger = models.CapacityLedger(6)
+		for day in range(3):
+			ledger.allocate(MONDAY + timedelta(days=day), 6)
+		ledger.first_available(MONDAY)
+		# Overbooked, and so no longer full, as the scheduler walking the
+		# days one by one saw it
+		ledger.allocate(MONDAY + timedelta(days=1), 2)
+		self.assertEqual(ledger.first_available(MONDAY), MONDAY + timedelta(days=1))
+
+class ScheduleEquivalenceTest(unittest.TestCase):
+
+	def assertSameSchedule(self, job):
+		expected = scheduler.CategoryScheduler(job)
+		expected.ledger = WalkingLedger(job.max_load)
+		expected = expected.run()
+		actual = scheduler.schedule_category(job)
+		self.assertEqual(slots(actual), slots(expected))
+		self.assertEqual(actual.errors, expected.errors)
+
+	def test_same_schedule_as_walking_every_day(self):
+		for seed in range(8):
+			self.assertSameSchedule(random_job(seed))
+
+	def test_same_schedule_without_deadlines(self):
+		job = random_job(1)
+		self.assertSameSchedule(job._replace(tasks=tuple([task._replace(end_date=None) for task in job.tasks])))
+
+class DaySpanTest(unittest.TestCase):
+
+	def test_from_slots_round_trip(self):
+		myrandom = random.Random(0)
+		day_slots = []
+		dt = MONDAY
+		for index in range(200):
+			day_slots.append(models.DaySlot(dt, myrandom.choice([6, 6, 6, 2])))
+			dt = utils.add_weekdays(dt, myrandom.choice([1, 1, 1, 2]))
+		spans = models.DaySpan.from_slots(day_slots)
+		self.assertLess(len(spans), len(day_slots))
+		self.assertEqual([(slot.date, slot.hours) for span in spans for slot in span.slots()], [(slot.date, slot.hours) for slot in day_slots])
+
+	def test_spans_built_backwards(self):
+		myrandom = random.Random(1)
+		for run in range(50):
+			# As a deadlined task is scheduled: back from its deadline, with
+			# partial days at both ends
+			dt = MONDAY + timedelta(days=7 * 20 + 4)
+			day_slots = [models.DaySlot(dt, myrandom.randint(1, 6))]
+			for index in range(myrandom.randint(0, 12)):
+				# Despite its name, the working day before
+				dt = utils.next_available_weekday(dt)
+				day_slots.append(models.DaySlot(dt, 6))
+			day_slots[-1].hours = myrandom.randint(1, 6)
+
+			spans = []
+			for slot in day_slots:
+				if not spans or not spans[-1].extend_back(slot.date, slot.hours):
+					spans.append(models.DaySpan(slot.date, 1, slot.hours))
+			spans = spans[::-1]
+			self.assertLessEqual(len(spans), 3)
+			self.assertEqual([(slot.date, slot.hours) for span in spans for slot in span.slots()], [(slot.date, slot.hours) for slot in reversed(day_slots)])
+
+	def test_weekly_hours(self):
+		# Wednesday to the next Tuesday, then 2 hours on Wednesday
+		span = models.DaySpan(MONDAY + timedelta(days=2), 5, 6, 2)
+		self.assertEqual(span.end, MONDAY + timedelta(days=9))
+		self.assertEqual(span.total, 32)
+		self.assertEqual(list(span.weekly_hours()), [(MONDAY + timedelta(days=2), 18), (MONDAY + timedelta(days=7), 12), (MONDAY + timedelta(days=9), 2)])
+
+class DeadlineIndexTest(unittest.TestCase):
+
+	def test_previous_and_next_deadlines_of_a_section(self):
+		task = lambda section, pos, end_date=None: scheduler.SchedulingTask(section, pos, end_date, 1, '', '')
+		tasks = [task(0, 0, MONDAY), task(0, 1), task(1, 2, MONDAY), task(0, 3), task(0, 4, MONDAY), task(0, 5)]
+		index = scheduler.DeadlineIndex(tasks)
+		self.assertEqual(index.tasks(0), [0, 4])
+		self.assertEqual((index.previous(tasks[1]), index.next(tasks[1])), (0, 4))
+		self.assertEqual((index.previous(tasks[3]), index.next(tasks[3])), (0, 4))
+		self.assertEqual((index.previous(tasks[5]), index.next(tasks[5])), (4, None))
+		self.assertEqual((index.previous(task(2, 6)), index.next(task(2, 6))), (None, None))
+
+	def test_same_as_searching_the_section(self):
+		job = random_job(2)
+		index = scheduler.DeadlineIndex(job.tasks)
+		for task in job.tasks:
+			deadlined = [i for i, other in enumerate(job.tasks) if other.section == task.section and other.end_date is not None]
+			before = [i for i in deadlined if job.tasks[i].pos < task.pos]
+			after = [i for i in deadlined if job.tasks[i].pos > task.pos]
+			self.assertEqual(index.previous(task), before[-1] if before else None)
+			self.assertEqual(index.next(task), after[0] if after else None)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,70 @@
+import os, sys
+import json
+import shutil
+import tempfile
+import unittest
+import importlib
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+engine = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.engine')
+sidecar = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.sidecar')
+
+with open(os.path.join(PACKAGE_DIR, 'example.projectplan.md'), encoding='utf-8') as f:
+	EXAMPLE = f.read()
+
+def spans(schedule):
+	return [[(span.start, span.days, span.hours, span.remainder) for span in task_spans] for task_spans in schedule.spans]
+
+class SidecarTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.path = sidecar.sidecar_path(os.path.join(self.folder, 'example.projectplan.md'))
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def test_path_is_hidden_next_to_the_plan(self):
+		self.assertEqual(self.path, os.path.join(self.folder, '.example.projectplan.md.schedule.json'))
+
+	def test_schedules_round_trip(self):
+		compiled = engine.PlanCompiler().compile(EXAMPLE, {'schedule_cache_sidecar': True}, sidecar=self.path)
+		saved = sidecar.load_schedules(self.path)
+		self.assertEqual(sorted(saved), sorted(compiled.statistics.categories))
+
+		sidecar.save_schedules(self.path, saved)
+		loaded = sidecar.load_schedules(self.path)
+		for category, (digest, schedule) in saved.items():
+			self.assertEqual(loaded[category][0], digest)
+			self.assertEqual(spans(loaded[category][1]), spans(schedule))
+			self.assertEqual(loaded[category][1].errors, schedule.errors)
+
+	def test_new_compiler_schedules_nothing_again(self):
+		compiled = engine.PlanCompiler().compile(EXAMPLE, {}, sidecar=self.path)
+
+		schedule_category = engine.schedule_category
+		def fail(job):
+			self.fail('{} was scheduled again'.format(job.category))
+		engine.schedule_category = fail
+		try:
+			reloaded = engine.PlanCompiler().compile(EXAMPLE, {}, sidecar=self.path)
+		finally:
+			engine.schedule_category = schedule_category
+		self.assertEqual(reloaded.text, compiled.text)
+		self.assertEqual(reloaded.errors, compiled.errors)
+
+	def test_unusable_sidecars_are_ignored(self):
+		self.assertEqual(sidecar.load_schedules(self.path), {})
+
+		with open(self.path, 'w', encoding='utf-8') as f:
+			f.write('{"version": 1, "schedules": [{"category"')
+		self.assertEqual(sidecar.load_schedules(self.path), {})
+
+		with open(self.path, 'w', encoding='utf-8') as f:
+			json.dump({'version': sidecar.SIDECAR_VERSION + 1, 'schedules': []}, f)
+		self.assertEqual(sidecar.load_schedules(self.path), {})
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,177 @@
+import os, sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import importlib
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+trollop = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.lib.trollop')
+trello_cache = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.trello_cache')
+
+class FakeResponse(object):
+
+	def __init__(self, status_code, text='', etag=None):
+		self.status_code = status_code
+		self.text = text
+		self.headers = {'ETag': etag} if etag else {}
+
+	def raise_for_status(self):
+		pass
+
+class FakeSession(object):
+	"""
+	Answers every GET with the current text of its path, or 304 when the
+	request carries its ETag
+	"""
+	def __init__(self, texts):
+		self.texts = texts
+		self.requests = []
+
+	def request(self, method, url, data=None, headers=None):
+		path = url[len('https://api.trello.com/1'):].split('?')[0]
+		self.requests.append((method, path, headers))
+		text = self.texts.get(path, '{}')
+		etag = 'W/"{}"'.format(hash(text))
+		if headers and headers.get('If-None-Match') == etag:
+			return FakeResponse(304)
+		return FakeResponse(200, text, etag)
+
+def connection(texts, cache):
+	conn = trollop.TrelloConnection('key', 'token', 1, cache)
+	conn._local.session = FakeSession(texts)
+	return conn
+
+class ResponseCacheTest(unittest.TestCase):
+
+	def test_ttl_of_what_a_path_points_to(self):
+		cache = trollop.ResponseCache(1000, ttls={'cards': 5})
+		self.assertEqual(cache.ttl('/boards/B1'), 30)
+		self.assertEqual(cache.ttl('/boards/B1/actions'), 0)
+		self.assertEqual(cache.ttl('/lists/L1/cards'), 5)
+		self.assertEqual(cache.ttl('/members/me'), 3600)
+		self.assertEqual(cache.ttl('/unknown/U1'), 0)
+
+	def test_size_is_counted_in_utf8_bytes(self):
+		cache = trollop.ResponseCache(10)
+		cache.store('/a', 'ééé')
+		cache.store('/b', 'éé')
+		self.assertEqual(cache.size, 10)
+		cache.store('/b', 'é')
+		self.assertEqual(cache.size, 8)
+		# Larger than the whole cache
+		cache.store('/c', 'é' * 6)
+		self.assertIsNone(cache.lookup('/c'))
+
+	def test_least_recently_used_is_dropped_first(self):
+		cache = trollop.ResponseCache(3)
+		cache.store('/a', 'a')
+		cache.store('/b', 'b')
+		cache.store('/c', 'c')
+		cache.lookup('/a')
+		cache.store('/d', 'd')
+		self.assertEqual([key for key, entry in cache.entries()], ['/c', '/a', '/d'])
+		self.assertEqual(cache.size, 3)
+
+	def test_invalidate_stops_at_path_boundaries(self):
+		cache = trollop.ResponseCache(1000)
+		for key in ['/cards/ab?', '/cards/ab?fields=name', '/cards/ab/checklists?', '/cards/abc?']:
+			cache.store(key, key)
+		cache.invalidate('/cards/ab')
+		self.assertEqual([key for key, entry in cache.entries()], ['/cards/abc?'])
+		self.assertEqual(cache.size, len('/cards/abc?'))
+
+		cache.invalidate()
+		self.assertEqual(len(cache), 0)
+		self.assertEqual(cache.size, 0)
+
+	def test_entries_restore_a_cache(self):
+		cache = trollop.ResponseCache(1000)
+		cache.store('/a', 'a', 'etag-a', stored_at=1)
+		cache.store('/b', 'bb')
+		restored = trollop.ResponseCache(1000, entries=cache.entries())
+		self.assertEqual(restored.entries(), cache.entries())
+		self.assertEqual(restored.size, cache.size)
+
+class CachedRequestTest(unittest.TestCase):
+
+	def setUp(self):
+		self.texts = {'/cards/ab': '{"name": "A"}', '/cards/abc': '{"name": "B"}'}
+		self.cache = trollop.ResponseCache(1000)
+		self.conn = connection(self.texts, self.cache)
+		self.session = self.conn._local.session
+
+	def test_fresh_response_is_served_from_the_cache(self):
+		self.assertEqual(self.conn.get('/cards/ab'), self.texts['/cards/ab'])
+		self.assertEqual(self.conn.get('/cards/ab'), self.texts['/cards/ab'])
+		self.assertEqual(len(self.session.requests), 1)
+
+	def test_expired_response_is_revalidated(self):
+		self.conn.get('/cards/ab')
+		key, entry = self.cache.entries()[0]
+		self.cache.store(key, entry.text, entry.etag, stored_at=time.time() - 60)
+
+		self.assertEqual(self.conn.get('/cards/ab'), self.texts['/cards/ab'])
+		self.assertEqual(self.session.requests[-1][2], {'If-None-Match': entry.etag})
+		# Fresh again after the 304
+		self.conn.get('/cards/ab')
+		self.assertEqual(len(self.session.requests), 2)
+
+	def test_changed_response_replaces_the_cached_one(self):
+		self.conn.get('/cards/ab')
+		self.texts['/cards/ab'] = '{"name": "changed"}'
+		self.assertEqual(self.conn.get('/cards/ab', revalidate=True), '{"name": "changed"}')
+		self.assertEqual(self.conn.get('/cards/ab'), '{"name": "changed"}')
+
+	def test_actions_are_always_asked_for(self):
+		self.conn.get('/boards/B1/actions')
+		self.conn.get('/boards/B1/actions')
+		self.assertEqual(len(self.session.requests), 2)
+
+	def test_writes_empty_the_cache(self):
+		self.conn.get('/cards/ab')
+		self.conn.put('/cards/ab/pos', {'value': 1})
+		self.assertEqual(len(self.cache), 0)
+
+	def test_reload_drops_only_the_object_and_what_is_under_it(self):
+		self.conn.get('/cards/ab')
+		self.conn.get('/cards/abc')
+		self.conn.preloaded = {'/cards/ab': {}, '/cards/ab/checklists': [], '/cards/abc': {}}
+
+		trollop.Card(self.conn, 'ab').reload()
+		self.assertEqual(list(self.conn.preloaded), ['/cards/abc'])
+		self.assertEqual([key for key, entry in self.cache.entries()], ['/cards/abc?'])
+
+class PersistedResponsesTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.path = trello_cache.responses_cache_path(self.folder)
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def test_round_trip(self):
+		cache = trollop.ResponseCache(1000, owner='me')
+		cache.store('/cards/ab?', '{"name": "é"}', 'etag', stored_at=1)
+		trello_cache.save_responses(self.path, cache)
+		self.assertEqual(trello_cache.load_responses(self.path, 'me'), cache.entries())
+
+	def test_responses_of_someone_else_are_ignored(self):
+		cache = trollop.ResponseCache(1000, owner='me')
+		cache.store('/cards/ab?', '{}')
+		trello_cache.save_responses(self.path, cache)
+		self.assertEqual(trello_cache.load_responses(self.path, 'you'), [])
+
+	def test_unusable_caches_are_ignored(self):
+		self.assertEqual(trello_cache.load_responses(self.path, 'me'), [])
+		os.makedirs(os.path.dirname(self.path))
+		with open(self.path, 'w', encoding='utf-8') as f:
+			json.dump({'version': trello_cache.TRELLO_CACHE_VERSION + 1, 'owner': 'me', 'entries': []}, f)
+		self.assertEqual(trello_cache.load_responses(self.path, 'me'), [])
+
+if __name__ == '__main__':
+	unittest.main()
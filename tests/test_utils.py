@@ -0,0 +1,53 @@
+import os, sys
+import stat
+import shutil
+import tempfile
+import unittest
+import importlib
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
+utils = importlib.import_module(os.path.basename(PACKAGE_DIR) + '.planner.utils')
+
+class WriteAtomicallyTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.path = os.path.join(self.folder, 'plan.projectplan.md')
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def mode(self):
+		return stat.S_IMODE(os.stat(self.path).st_mode)
+
+	def test_content_is_written_as_is(self):
+		utils.write_atomically(self.path, 'a\r\nb\nc')
+		with open(self.path, 'rb') as f:
+			self.assertEqual(f.read(), b'a\r\nb\nc')
+		self.assertEqual(os.listdir(self.folder), ['plan.projectplan.md'])
+
+	def test_new_file_gets_the_usual_permissions(self):
+		utils.write_atomically(self.path, 'plan')
+		self.assertEqual(self.mode(), 0o666 & ~utils.UMASK)
+
+	@unittest.skipIf(os.name == 'nt', 'only the read-only flag exists on Windows')
+	def test_permissions_are_kept(self):
+		utils.write_atomically(self.path, 'plan')
+		os.chmod(self.path, 0o640)
+		utils.write_atomically(self.path, 'new plan')
+		self.assertEqual(self.mode(), 0o640)
+
+	def test_umask_is_left_alone(self):
+		umask = os.umask
+		def fail(mask):
+			self.fail('the umask was changed')
+		os.umask = fail
+		try:
+			utils.write_atomically(self.path, 'plan')
+		finally:
+			os.umask = umask
+
+if __name__ == '__main__':
+	unittest.main()